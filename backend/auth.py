@@ -1,22 +1,107 @@
 # backend/auth.py
 # JWT verification locally (Performance optimized)
+#
+# Verified tokens are cached: the mobile app sends the same access token on
+# every request for its whole lifetime, so the HMAC check and claim parsing run
+# once per token instead of once per request. Entries are keyed by sha256 of the
+# token (raw tokens are never kept), live until the token's exp, and hold a
+# frozen AuthenticatedUser that is shared between requests. Bad tokens are
+# cached too (AUTH_NEGATIVE_TTL), so a client retrying garbage costs a dict lookup.
 
+import hashlib
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
 import jwt  # pip install pyjwt
-from typing import Optional
 from fastapi import HTTPException, Header, Depends
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+
+logger = logging.getLogger(__name__)
 
 # Supabase configuration
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
 ALGORITHM = "HS256"
 
+# Token cache
+TOKEN_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "4096"))
+TOKEN_CACHE_MAX_TTL_S = float(os.getenv("AUTH_CACHE_MAX_TTL", "3600"))  # also used for tokens without exp
+TOKEN_NEGATIVE_TTL_S = float(os.getenv("AUTH_NEGATIVE_TTL", "60"))
+
 class AuthenticatedUser(BaseModel):
-    """Represents an authenticated user from Supabase"""
+    """Represents an authenticated user from Supabase (immutable: one instance is shared per cached token)"""
+    model_config = ConfigDict(frozen=True)
+
     id: str
     email: Optional[str] = None
     role: str = "authenticated"
 
+
+class TokenCache:
+    """
+    LRU of token digest -> (expires_at, user or None for a rejected token).
+    All access is under one lock and never awaits, so it is safe across threads
+    (sync endpoints run in the threadpool) and event-loop tasks alike.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[bytes, Tuple[float, Optional[AuthenticatedUser]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, digest: bytes) -> Tuple[bool, Optional[AuthenticatedUser]]:
+        """(found, user); found with user None means the token is known to be bad."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                expires, user = entry
+                if expires > now:
+                    self._entries.move_to_end(digest)
+                    if user is None:
+                        self.negative_hits += 1
+                    else:
+                        self.hits += 1
+                    return True, user
+                del self._entries[digest]
+            self.misses += 1
+            return False, None
+
+    def put(self, digest: bytes, user: Optional[AuthenticatedUser], expires: float):
+        with self._lock:
+            self._entries[digest] = (expires, user)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+        }
+
+
+_TOKEN_CACHE = TokenCache()
+
+def get_token_cache() -> TokenCache:
+    return _TOKEN_CACHE
+
+
 async def verify_token_locally(token: str) -> Optional[dict]:
     """
     Verify JWT token locally using the secret.
@@ -24,24 +109,65 @@ async def verify_token_locally(token: str) -> Optional[dict]:
     """
     if not SUPABASE_JWT_SECRET:
         # 如果没有配置 Secret，为了安全起见，返回 None (或者你可以选择在开发环境放行，但不推荐)
-        print("Error: SUPABASE_JWT_SECRET is not set in environment variables.")
+        logger.error("SUPABASE_JWT_SECRET is not set in environment variables.")
         return None
-    
+
     try:
         # Supabase tokens usually have 'aud': 'authenticated'.
         # If you encounter "Invalid audience" errors, you can set verify_aud=False
         payload = jwt.decode(
-            token, 
-            SUPABASE_JWT_SECRET, 
+            token,
+            SUPABASE_JWT_SECRET,
             algorithms=[ALGORITHM],
-            options={"verify_aud": False} 
+            options={"verify_aud": False}
         )
         return payload
     except jwt.ExpiredSignatureError:
         return None
     except jwt.PyJWTError as e:
-        print(f"JWT Verification Error: {e}")
+        logger.info(f"JWT Verification Error: {e}")
+        return None
+
+
+async def authenticate(token: str) -> Optional[AuthenticatedUser]:
+    """User for a bearer token (None if invalid/expired), served from the token cache when possible."""
+    cache = get_token_cache()
+    digest = hashlib.sha256(token.encode()).digest()
+    found, user = cache.get(digest)
+    if found:
+        return user
+
+    payload = await verify_token_locally(token)
+    if not SUPABASE_JWT_SECRET:
+        return None  # misconfiguration, not a bad token: don't remember it
+
+    now = time.time()
+    sub = payload.get("sub") if payload else None
+    if not sub:
+        # Supabase JWT payload 中，用户 ID 在 'sub' 字段; no sub -> not a usable token
+        cache.put(digest, None, now + TOKEN_NEGATIVE_TTL_S)
+        return None
+
+    user = AuthenticatedUser(
+        id=sub,
+        email=payload.get("email"),
+        role=payload.get("role", "authenticated"),
+    )
+    expires = now + TOKEN_CACHE_MAX_TTL_S
+    if isinstance(payload.get("exp"), (int, float)):
+        expires = min(expires, float(payload["exp"]))
+    cache.put(digest, user, expires)
+    return user
+
+
+def _bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if not authorization:
+        return None
+    parts = authorization.split()
+    if len(parts) != 2 or parts[0].lower() != "bearer":
         return None
+    return parts[1]
+
 
 async def get_current_user(
     authorization: Optional[str] = Header(None, alias="Authorization")
@@ -56,33 +182,26 @@ async def get_current_user(
             detail="Missing Authorization header",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    parts = authorization.split()
-    if len(parts) != 2 or parts[0].lower() != "bearer":
+
+    token = _bearer_token(authorization)
+    if token is None:
         raise HTTPException(
             status_code=401,
             detail="Invalid Authorization header format. Use: Bearer <token>",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    token = parts[1]
-    
-    # 使用本地验证替代远程请求
-    payload = await verify_token_locally(token)
-    
-    if not payload:
+
+    # 使用本地验证替代远程请求 (cached per token until it expires)
+    user = await authenticate(token)
+
+    if user is None:
         raise HTTPException(
             status_code=401,
             detail="Invalid or expired token",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    # Supabase JWT payload 中，用户 ID 通常在 'sub' 字段
-    return AuthenticatedUser(
-        id=payload.get("sub"),
-        email=payload.get("email"),
-        role=payload.get("role", "authenticated"),
-    )
+
+    return user
 
 async def get_optional_user(
     authorization: Optional[str] = Header(None, alias="Authorization")
@@ -91,21 +210,8 @@ async def get_optional_user(
     FastAPI dependency to optionally get the current user.
     Returns None if not authenticated.
     """
-    if not authorization:
-        return None
-    
-    parts = authorization.split()
-    if len(parts) != 2 or parts[0].lower() != "bearer":
-        return None
-    
-    token = parts[1]
-    payload = await verify_token_locally(token)
-    
-    if not payload:
+    token = _bearer_token(authorization)
+    if token is None:
         return None
-    
-    return AuthenticatedUser(
-        id=payload.get("sub"),
-        email=payload.get("email"),
-        role=payload.get("role", "authenticated"),
-    )
\ No newline at end of file
+
+    return await authenticate(token)
@@ -0,0 +1,291 @@
+# backend/benchmarks.py
+# Database micro-benchmarks, run against a throwaway database:
+#   python -m backend.benchmarks feed [--url sqlite:///./data/bench.db]
+#   python -m backend.benchmarks write [--url ...]
+#   python -m backend.benchmarks async [--url ...]
+#   python -m backend.benchmarks sqlite [--url sqlite:///...]
+# The default URL is a temporary SQLite file; pass a PostgreSQL URL to compare.
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import models
+from backend.database import _async_url, apply_sqlite_profile
+
+
+def _timeit(fn: Callable[[], object], repeat: int = 20) -> float:
+    """Median wall time in ms (after one warm-up call)."""
+    fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return times[len(times) // 2] * 1000.0
+
+
+def _engine(url: str):
+    eng = create_engine(url)
+    models.Base.metadata.drop_all(eng)
+    models.Base.metadata.create_all(eng)
+    return eng
+
+
+def _fill_catches(eng, n: int, users: int = 20):
+    rnd = random.Random(0)
+    now = datetime.utcnow()
+    rows = [
+        {
+            "image_path": f"/assets/uploads/{i}.jpg",
+            "species_label": "Bluegill",
+            "species_confidence": 0.5,
+            "user_id": f"user-{rnd.randrange(users)}",
+            "lat": rnd.uniform(41.0, 43.0),
+            "lng": rnd.uniform(-73.0, -70.0),
+            "created_at": now,
+            "status": "ready",
+        }
+        for i in range(n)
+    ]
+    with eng.begin() as conn:
+        for i in range(0, n, 5000):
+            conn.execute(models.Catch.__table__.insert(), rows[i:i + 5000])
+
+
+def bench_feed(url: str, n: int = 200000, limit: int = 50):
+    """Page latency at increasing depth: OFFSET vs keyset (id < cursor), community and per-user."""
+    eng = _engine(url)
+    _fill_catches(eng, n)
+    db = sessionmaker(bind=eng)()
+    C = models.Catch
+    ids = [r.id for r in db.query(C.id).order_by(C.id.desc())]
+    uid = "user-7"
+    mine = [r.id for r in db.query(C.id).filter(C.user_id == uid).order_by(C.id.desc())]
+
+    print(f"{n} catches, page size {limit}")
+    print(f"{'feed':>6} {'depth':>7} {'offset ms':>10} {'keyset ms':>10}")
+    for depth in (0, 1000, 10000, 100000, 190000):
+        if depth >= len(ids):
+            continue
+        t_off = _timeit(lambda: db.query(C).order_by(C.id.desc()).offset(depth).limit(limit).all())
+        t_key = _timeit(lambda: db.query(C).filter(C.id < ids[depth - 1] if depth else True)
+                        .order_by(C.id.desc()).limit(limit).all())
+        print(f"{'all':>6} {depth:>7} {t_off:>10.2f} {t_key:>10.2f}")
+    for depth in (0, 1000, len(mine) - limit):
+        t_off = _timeit(lambda: db.query(C).filter(C.user_id == uid).order_by(C.id.desc())
+                        .offset(depth).limit(limit).all())
+        t_key = _timeit(lambda: db.query(C).filter(C.user_id == uid, C.id < mine[depth - 1] if depth else True)
+                        .order_by(C.id.desc()).limit(limit).all())
+        print(f"{'mine':>6} {depth:>7} {t_off:>10.2f} {t_key:>10.2f}")
+    db.close()
+
+
+def bench_write(url: str, n: int = 300):
+    """create_catch: statements and latency per catch (species resolution + user link)."""
+    from backend.services import catalog_service, catch_service
+
+    eng = _engine(url)
+    statements = [0]
+    event.listen(eng, "before_cursor_execute", lambda *a: statements.__setitem__(0, statements[0] + 1))
+    db = sessionmaker(bind=eng)()
+    catalog_service.invalidate()
+
+    def run(label: str, user_of: Callable[[int], str], labels: Callable[[int], str]):
+        statements[0] = 0
+        t0 = time.perf_counter()
+        for i in range(n):
+            catch_service.create_catch(db, user_of(i), "/assets/uploads/x.jpg", labels(i), 0.9)
+        ms = (time.perf_counter() - t0) * 1000.0 / n
+        print(f"{label:<34} {statements[0] / n:>6.1f} {ms:>8.2f}")
+
+    print(f"{eng.dialect.name}, {n} catches per row (position-less, so no cluster upserts)")
+    print(f"{'scenario':<34} {'stmts':>6} {'ms':>8}")
+    run("new species, new link", lambda i: "u0", lambda i: f"Species {i}")
+    run("known species, new link", lambda i: f"u{i + 1}", lambda i: "Species 0")
+    run("known species, existing link", lambda i: "u0", lambda i: f"species {i}")
+    catalog_service.invalidate()
+    run("cold name cache, existing link", lambda i: "u0", lambda i: f"Species {i}")
+    run("anonymous", lambda i: None, lambda i: "Species 1")
+    db.close()
+
+
+def bench_async(url: str, requests: int = 20, slow_ms: int = 50):
+    """
+    `requests` concurrent handlers each running one slow query (slow_ms), on one
+    event loop: sync Session inside async def vs AsyncSession. Also reports the
+    worst event-loop stall, i.e. how long any other request would have waited.
+    """
+    _engine(url).dispose()
+    async_url, connect_args = _async_url(url)
+    sync_eng = create_engine(url, pool_size=requests, max_overflow=0)
+    async_eng = create_async_engine(async_url, connect_args=connect_args, pool_size=requests, max_overflow=0)
+
+    if sync_eng.dialect.name == "sqlite":
+        def slow(value):
+            time.sleep(slow_ms / 1000.0)
+            return value
+
+        for eng in (sync_eng, async_eng.sync_engine):
+            event.listen(eng, "connect", lambda dbapi_conn, _: dbapi_conn.create_function("slow", 1, slow))
+        query = text("SELECT slow(count(*)) FROM catches")
+    else:
+        query = text(f"SELECT count(*) FROM catches, pg_sleep({slow_ms / 1000.0})")
+
+    SyncSession = sessionmaker(bind=sync_eng)
+
+    async def sync_handler():
+        with SyncSession() as db:  # blocks the loop for the whole query
+            db.execute(query).scalar()
+
+    async def async_handler():
+        async with async_eng.connect() as conn:  # awaits; other handlers run meanwhile
+            (await conn.execute(query)).scalar()
+
+    async def run(handler) -> tuple:
+        stall = [0.0]
+        done = asyncio.Event()
+
+        async def ticker():
+            last = time.perf_counter()
+            while not done.is_set():
+                await asyncio.sleep(0.001)
+                now = time.perf_counter()
+                stall[0] = max(stall[0], now - last - 0.001)
+                last = now
+
+        await handler()  # warm-up: connections + function registration
+        tick = asyncio.create_task(ticker())
+        t0 = time.perf_counter()
+        await asyncio.gather(*(handler() for _ in range(requests)))
+        wall = time.perf_counter() - t0
+        done.set()
+        await tick
+        return wall * 1000.0, stall[0] * 1000.0
+
+    async def main():
+        print(f"{sync_eng.dialect.name}, {requests} concurrent requests, {slow_ms} ms query each")
+        print(f"{'session':<10} {'wall ms':>9} {'max loop stall ms':>18}")
+        for label, handler in (("sync", sync_handler), ("async", async_handler)):
+            wall, stall = await run(handler)
+            print(f"{label:<10} {wall:>9.1f} {stall:>18.1f}")
+        await async_eng.dispose()
+
+    asyncio.run(main())
+    sync_eng.dispose()
+
+
+def bench_sqlite(url: str, writers: int = 8, readers: int = 8, ops: int = 50):
+    """
+    Mixed load on the async SQLite engine: `writers` tasks each saving `ops`
+    catches (add_catch + commit, as /fish/identify does) while `readers` tasks
+    page the feed. Default SQLite vs the tuned profile (pragmas + writer queue).
+    """
+    from backend.services import catalog_service, catch_service
+
+    if make_url(url).get_backend_name() != "sqlite":
+        raise SystemExit("bench sqlite needs a sqlite:/// URL")
+    C = models.Catch
+    feed = select(C).order_by(C.id.desc()).limit(50)
+
+    def pct(values, q):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * q))] * 1000.0 if values else 0.0
+
+    async def run(tuned: bool) -> dict:
+        file_url = f"{url}-{'tuned' if tuned else 'default'}"
+        _engine(file_url).dispose()
+        async_url, _ = _async_url(file_url)
+        eng = create_async_engine(async_url, pool_size=writers + readers, max_overflow=0)
+        if tuned:
+            apply_sqlite_profile(eng.sync_engine)
+        lock = asyncio.Lock() if tuned else None
+        catalog_service.invalidate()
+        lat = {"write": [], "read": []}
+        errors = [0]
+
+        async def write_one(db, w, i):
+            def save(s):
+                catch_service.add_catch(s, f"user-{w}", "/assets/uploads/x.jpg", f"Species {i % 20}", 0.9,
+                                        lat=42.0 + w / 100.0, lng=-71.0 + i / 1000.0)
+                s.commit()
+            await db.run_sync(save)
+
+        async def writer_task(w):
+            for i in range(ops):
+                t0 = time.perf_counter()
+                try:
+                    async with AsyncSession(eng, expire_on_commit=False) as db:
+                        if lock is not None:
+                            async with lock:
+                                await write_one(db, w, i)
+                        else:
+                            await write_one(db, w, i)
+                    lat["write"].append(time.perf_counter() - t0)
+                except Exception:
+                    errors[0] += 1
+
+        stop = asyncio.Event()
+
+        async def reader_task():
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                try:
+                    async with eng.connect() as conn:
+                        (await conn.execute(feed)).all()
+                    lat["read"].append(time.perf_counter() - t0)
+                except Exception:
+                    errors[0] += 1
+                await asyncio.sleep(0)
+
+        t0 = time.perf_counter()
+        reading = [asyncio.create_task(reader_task()) for _ in range(readers)]
+        await asyncio.gather(*(writer_task(w) for w in range(writers)))
+        wall = time.perf_counter() - t0
+        stop.set()
+        await asyncio.gather(*reading)
+        await eng.dispose()
+        return {
+            "writes/s": len(lat["write"]) / wall,
+            "reads/s": len(lat["read"]) / wall,
+            "write p50": pct(lat["write"], 0.5), "write p95": pct(lat["write"], 0.95),
+            "read p50": pct(lat["read"], 0.5), "read p95": pct(lat["read"], 0.95),
+            "errors": errors[0],
+        }
+
+    async def main():
+        print(f"{writers} writers x {ops} catches, {readers} feed readers (latencies in ms)")
+        cols = ("writes/s", "reads/s", "write p50", "write p95", "read p50", "read p95", "errors")
+        print(f"{'profile':<8}" + "".join(f"{c:>11}" for c in cols))
+        for tuned in (False, True):
+            r = await run(tuned)
+            print(f"{'tuned' if tuned else 'default':<8}" + "".join(f"{r[c]:>11.1f}" for c in cols))
+
+    asyncio.run(main())
+
+
+BENCHES = {
+    "feed": bench_feed,
+    "write": bench_write,
+    "async": bench_async,
+    "sqlite": bench_sqlite,
+}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Database micro-benchmarks")
+    ap.add_argument("bench", choices=sorted(BENCHES))
+    ap.add_argument("--url", help="SQLAlchemy URL of a scratch database (tables are dropped!)")
+    args = ap.parse_args()
+    url = args.url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    BENCHES[args.bench](url)
@@ -1,8 +1,17 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import Select, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from contextlib import asynccontextmanager, nullcontext
+from typing import Dict, Optional
+import asyncio
+import itertools
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -25,6 +34,259 @@ else:
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
+# ---------- Async engine (request handlers) ----------
+# Same database through an asyncio driver, so an `async def` route awaits its
+# queries instead of blocking the event loop: asyncpg for PostgreSQL, aiosqlite
+# for the SQLite fallback. The sync engine above stays for admin routes,
+# background tasks and scripts. ASYNC_DATABASE_URL overrides the derived URL.
+def _async_url(url: str):
+    """DATABASE_URL with its driver swapped for the asyncio one, plus connect_args."""
+    u = make_url(url)
+    connect_args = {}
+    if u.get_backend_name() == "sqlite":
+        return u.set(drivername="sqlite+aiosqlite"), connect_args
+    u = u.set(drivername="postgresql+asyncpg")
+    if "sslmode" in u.query:  # libpq option; asyncpg takes ssl=
+        connect_args["ssl"] = u.query["sslmode"]
+        u = u.difference_update_query(["sslmode"])
+    if u.port == 6543:
+        # Supabase transaction pooler (PgBouncer): server-side prepared statements don't survive it
+        connect_args["statement_cache_size"] = 0
+        u = u.update_query_dict({"prepared_statement_cache_size": "0"})
+    return u, connect_args
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+if ASYNC_DATABASE_URL:
+    _async_target, _async_connect_args = make_url(ASYNC_DATABASE_URL), {}
+else:
+    _async_target, _async_connect_args = _async_url(DATABASE_URL)
+async_engine = create_async_engine(
+    _async_target,
+    connect_args=_async_connect_args,
+    pool_pre_ping=_async_target.get_backend_name() != "sqlite",
+)
+
+
+# ---------- Read replicas ----------
+# DATABASE_REPLICA_URLS: comma-separated read replicas of DATABASE_URL (same
+# formats; e.g. a second SQLite file locally). Sessions from read_session() send
+# their SELECTs to one of them (round robin); flushes, INSERT/UPDATE/DELETE and
+# everything after the first write in a session go to the primary. A user who
+# just wrote (catch created, patched, deleted or enriched) reads from the primary
+# for REPLICA_STICKY_S so they see their own writes despite replication lag
+# (per process, like the other caches). Without replicas everything is primary.
+REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_STICKY_S = float(os.getenv("REPLICA_STICKY_S", "15"))
+PRIMARY = {"read_primary": True}  # .execution_options(**PRIMARY): this SELECT must see the primary
+
+
+def _replica_engine(url: str):
+    target, connect_args = _async_url(url.replace("postgres://", "postgresql://", 1))
+    return create_async_engine(target, connect_args=connect_args, pool_pre_ping=target.get_backend_name() != "sqlite")
+
+
+replica_engines = [_replica_engine(u) for u in REPLICA_URLS]
+_next_replica = itertools.cycle(replica_engines) if replica_engines else None
+
+
+class RoutingSession(Session):
+    """Sync side of every AsyncSession here: SELECTs go to info["replica"] when a read session set one."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is not None:
+            if (isinstance(clause, Select) and not self._flushing and clause._for_update_arg is None
+                    and not clause._execution_options.get("read_primary")):
+                return replica.sync_engine
+            if not isinstance(clause, Select):
+                self.info.pop("replica")  # this session writes: read our own writes from here on
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+# expire_on_commit=False: attributes can't lazy-load after an await, so committed
+# objects keep their loaded values (refresh() explicitly where needed)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, sync_session_class=RoutingSession,
+    autoflush=False, expire_on_commit=False,
+)
+
+_sticky: Dict[str, float] = {}  # user_id -> read from the primary until (monotonic)
+_sticky_lock = threading.Lock()
+_WROTE = "replica_wrote_users"
+
+
+def mark_user_wrote(db: Session, user_id: Optional[str]) -> None:
+    """user_id changed data in db's transaction: once it commits, route their reads to the primary for a while."""
+    if user_id and replica_engines:
+        db.info.setdefault(_WROTE, set()).add(user_id)
+
+
+def reads_from_primary(user_id: Optional[str]) -> bool:
+    if not user_id:
+        return False
+    with _sticky_lock:
+        until = _sticky.get(user_id)
+        if until is not None and until <= time.monotonic():
+            del _sticky[user_id]
+            return False
+        return until is not None
+
+
+@event.listens_for(Session, "after_commit")
+def _stick_writers(session: Session):
+    users = session.info.pop(_WROTE, None)
+    if users:
+        now = time.monotonic()
+        with _sticky_lock:
+            for uid in users:
+                _sticky[uid] = now + REPLICA_STICKY_S
+            if len(_sticky) > 10000:
+                for uid in [u for u, t in _sticky.items() if t <= now]:
+                    del _sticky[uid]
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_writers(session: Session):
+    session.info.pop(_WROTE, None)
+
+
+# ---------- SQLite profile (local fallback) ----------
+# Default journaling makes readers and the writer block each other and a busy
+# writer fails at once with "database is locked". Tuned (SQLITE_TUNED=1, default):
+#   WAL               readers never block the writer and vice versa
+#   synchronous=NORMAL  fsync at checkpoints only (safe with WAL; a crash can lose
+#                       the last commits but never corrupts)
+#   busy_timeout      wait for the write lock instead of failing
+#   mmap / cache      fewer read syscalls, bigger page cache
+# Writes from this process also go through writer(), one at a time, so they
+# queue in order instead of polling in SQLite's busy handler.
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "1") != "0"
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    ("mmap_size", os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024))),
+    ("cache_size", os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB (64 MB)
+    ("temp_store", "MEMORY"),
+)
+
+
+def apply_sqlite_profile(eng) -> None:
+    """Run SQLITE_PRAGMAS on every new connection of a SQLite engine (sync, or async_engine.sync_engine)."""
+    @event.listens_for(eng, "connect")
+    def _pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        for name, value in SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+IS_SQLITE = engine.dialect.name == "sqlite"
+if IS_SQLITE and SQLITE_TUNED:
+    apply_sqlite_profile(engine)
+    for _eng in [async_engine, *replica_engines]:
+        if _eng.dialect.name == "sqlite":
+            apply_sqlite_profile(_eng.sync_engine)
+
+# Lock is bound to the loop that first uses it; rebuilt if the loop changed (as in ml/batching.py)
+_write_lock: Optional[asyncio.Lock] = None
+_write_lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_write_lock() -> asyncio.Lock:
+    global _write_lock, _write_lock_loop
+    loop = asyncio.get_running_loop()
+    if _write_lock is None or _write_lock_loop is not loop:
+        _write_lock, _write_lock_loop = asyncio.Lock(), loop
+    return _write_lock
+
+
+@asynccontextmanager
+async def writer():
+    """
+    Around a write transaction on the async engine: with tuned SQLite, one writer
+    at a time (FIFO; readers are not affected under WAL). No-op on PostgreSQL.
+    """
+    if not (IS_SQLITE and SQLITE_TUNED):
+        yield
+        return
+    async with _get_write_lock():
+        yield
+
+
+# ---------- Pool metrics ----------
+SLOW_CHECKOUT_S = float(os.getenv("DB_SLOW_CHECKOUT_MS", "100")) / 1000.0
+
+class PoolStats:
+    """
+    Connection pool usage for one engine: checkouts in use (and the peak) from
+    pool events, plus how long session_scope() callers waited for a connection.
+    A rising wait / slow_checkouts means the pool is too small for the load or
+    connections are held too long.
+    """
+
+    def __init__(self, eng):
+        self.pool = eng.pool
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waits = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+        self.slow_checkouts = 0
+        event.listen(eng, "checkout", self._on_checkout)
+        event.listen(eng, "checkin", self._on_checkin)
+
+    def _on_checkout(self, dbapi_conn, record, proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def _on_checkin(self, dbapi_conn, record):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.waits += 1
+            self.wait_total_s += seconds
+            self.wait_max_s = max(self.wait_max_s, seconds)
+            if seconds >= SLOW_CHECKOUT_S:
+                self.slow_checkouts += 1
+
+    def stats(self) -> dict:
+        pool = self.pool
+        return {
+            "pool": type(pool).__name__,
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "max_overflow": getattr(pool, "_max_overflow", None),
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else self.in_use,
+            "peak_checked_out": self.peak_in_use,
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "avg_wait_ms": self.wait_total_s / self.waits * 1000.0 if self.waits else 0.0,
+            "max_wait_ms": self.wait_max_s * 1000.0,
+            "slow_checkouts": self.slow_checkouts,
+        }
+
+
+pool_stats = PoolStats(engine)
+async_pool_stats = PoolStats(async_engine.sync_engine)
+replica_pool_stats = [PoolStats(eng.sync_engine) for eng in replica_engines]
+
+def dialect_insert(db):
+    """insert() with on_conflict_do_update/do_nothing for the session's backend (PostgreSQL or SQLite).
+    Services take a sync Session; async handlers reach them through AsyncSession.run_sync."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
 # FastAPI dependency: get DB session per request
 def get_db():
     db = SessionLocal()
@@ -32,3 +294,30 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Async variant for `async def` routes: queries are awaited, services run via db.run_sync(fn, ...)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Read-only session: SELECTs go to a replica, unless user_id wrote recently
+# (the request-level dependency is get_read_db in backend/routers/deps.py)
+@asynccontextmanager
+async def read_session(user_id: Optional[str] = None):
+    async with AsyncSessionLocal() as db:
+        if _next_replica is not None and not reads_from_primary(user_id):
+            db.sync_session.info["replica"] = next(_next_replica)
+        yield db
+
+# Scoped alternative to the dependencies for handlers that await slow work
+# (inference, uploads, weather): open it around the DB work only, so the pooled
+# connection is held for that block instead of the whole request.
+# write=True also takes writer() for the block (queued before the checkout).
+@asynccontextmanager
+async def session_scope(write: bool = False):
+    async with writer() if write else nullcontext():
+        async with AsyncSessionLocal() as db:
+            t0 = time.perf_counter()
+            await db.connection()  # check out now, to measure the pool wait
+            async_pool_stats.record_wait(time.perf_counter() - t0)
+            yield db
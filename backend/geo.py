@@ -0,0 +1,98 @@
+# backend/geo.py
+# Fixed lat/lng grid used to index catches spatially on both SQLite and PostgreSQL
+# (no PostGIS needed): each catch stores the integer id of its grid cell in an
+# ordinary B-tree indexed column. Cells are numbered row-major, so the cells of one
+# grid row inside a bounding box form a contiguous id range -> one index range scan per row.
+
+import math
+from typing import List, Optional, Tuple
+
+CELL_DEG = 0.1                      # ~11 km at the equator; catches.geo_cell
+MAX_RANGES = 64                     # above this, scan one wide range and let lat/lng filter
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def has_position(lat: Optional[float], lng: Optional[float]) -> bool:
+    """Missing and (0, 0) "null island" coordinates are not real positions."""
+    return lat is not None and lng is not None and not (lat == 0 and lng == 0)
+
+
+def _cols(deg: float) -> int:
+    return int(math.ceil(360.0 / deg - 1e-9))
+
+
+def _row(lat: float, deg: float) -> int:
+    return min(int(math.ceil(180.0 / deg - 1e-9)) - 1, max(0, math.floor((lat + 90.0) / deg)))
+
+
+def _col(lng: float, deg: float) -> int:
+    return min(_cols(deg) - 1, max(0, math.floor((lng + 180.0) / deg)))
+
+
+def cell_of(lat: Optional[float], lng: Optional[float], deg: float = CELL_DEG) -> Optional[int]:
+    if not has_position(lat, lng):
+        return None
+    return _row(lat, deg) * _cols(deg) + _col(lng, deg)
+
+
+def cell_center(cell: int, deg: float = CELL_DEG) -> Tuple[float, float]:
+    row, col = divmod(cell, _cols(deg))
+    return (row + 0.5) * deg - 90.0, (col + 0.5) * deg - 180.0
+
+
+def cell_ranges(min_lat: float, min_lng: float, max_lat: float, max_lng: float,
+                deg: float = CELL_DEG) -> List[Tuple[int, int]]:
+    """
+    Inclusive cell-id ranges covering a bbox. min_lng > max_lng means the box
+    crosses the antimeridian. Results may cover a bit more than the box;
+    callers still filter on lat/lng exactly.
+    """
+    cols = _cols(deg)
+    r0, r1 = _row(min_lat, deg), _row(max_lat, deg)
+    if min_lng <= max_lng:
+        col_spans = [(_col(min_lng, deg), _col(max_lng, deg))]
+    else:
+        col_spans = [(_col(min_lng, deg), cols - 1), (0, _col(max_lng, deg))]
+
+    if (r1 - r0 + 1) * len(col_spans) > MAX_RANGES:
+        return [(r0 * cols, r1 * cols + cols - 1)]
+    return [(r * cols + c0, r * cols + c1) for r in range(r0, r1 + 1) for c0, c1 in col_spans]
+
+
+# --- Cluster zoom levels ---
+# Map zoom z has tiles 360/2^z degrees wide; we keep aggregates for a subset
+# of zooms and serve other zooms from the next coarser one.
+CLUSTER_ZOOMS = (2, 4, 6, 8, 10, 12)
+
+
+def cluster_zoom(zoom: int) -> int:
+    """Maintained zoom level to serve a requested map zoom from."""
+    return max([z for z in CLUSTER_ZOOMS if z <= zoom] or [CLUSTER_ZOOMS[0]])
+
+
+def zoom_deg(zoom: int) -> float:
+    return 360.0 / (2 ** zoom)
+
+
+def radius_bbox(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lng, max_lat, max_lng) enclosing a circle."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    coslat = math.cos(math.radians(lat))
+    dlng = 180.0 if coslat < 1e-6 else min(180.0, math.degrees(radius_km / (EARTH_RADIUS_KM * coslat)))
+    min_lng, max_lng = lng - dlng, lng + dlng
+    if dlng >= 180.0:
+        min_lng, max_lng = -180.0, 180.0
+    else:
+        if min_lng < -180.0:
+            min_lng += 360.0
+        if max_lng > 180.0:
+            max_lng -= 360.0
+    return max(-90.0, lat - dlat), min_lng, min(90.0, lat + dlat), max_lng
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
@@ -1,17 +1,29 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.types import Scope
+import logging
 
-from backend.database import engine
+from backend.database import SessionLocal, engine
 from backend import models
 from backend.routers import fish, catches, species, admin_migrate, stats
 from backend.routers import predict as predict_router
+from backend.services import catalog_service, enrich_service, leaderboard_service, weather_service
+from backend.services.upload_service import UploadLimitMiddleware
+from ml.executor import InferenceBusy, get_executor
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Fishing App API")
 
 # Create tables
 models.Base.metadata.create_all(bind=engine)
 
+# Upload size limit: 413 before an oversized body is parsed/spooled (services/upload_service.py)
+app.add_middleware(UploadLimitMiddleware)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -19,8 +31,44 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Inference backpressure: shed load instead of queueing without bound
+@app.exception_handler(InferenceBusy)
+async def inference_busy_handler(request: Request, exc: InferenceBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Inference is busy, retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.on_event("startup")
+def warm_caches():
+    db = SessionLocal()
+    try:
+        # columns/indexes added since the first deploy (species.name_key ...) and the
+        # user_scores backfill, so an existing database works without a manual
+        # POST /admin/migrate_schema first
+        try:
+            admin_migrate.apply_schema(db)
+            leaderboard_service.backfill_if_empty(db)
+            db.commit()
+        except SQLAlchemyError as e:  # e.g. another worker migrating at the same time
+            db.rollback()
+            logger.warning(f"Schema migration at startup failed: {e}")
+        # species name -> id for the catch write path (services/catalog_service.py)
+        catalog_service.warm_species_refs(db)
+    finally:
+        db.close()
+    # catches left "pending" by a previous process that died before storing their image
+    enrich_service.settle_stale()
+
+@app.on_event("shutdown")
+async def shutdown_pools():
+    get_executor().shutdown()
+    await weather_service.close_client()
+
 @app.get("/")
 def root():
     return {"message": "Fishing App Backend is running"}
@@ -30,7 +78,17 @@ def health():
     return {"status": "ok"}
 
 # Static files
-app.mount("/assets", StaticFiles(directory="assets"), name="assets")
+class ImmutableStaticFiles(StaticFiles):
+    """Uploads and derivatives are named by content hash, so they never change: cache for a year.
+    StaticFiles already sends ETag/Last-Modified and answers If-None-Match with 304."""
+
+    async def get_response(self, path: str, scope: Scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+app.mount("/assets", ImmutableStaticFiles(directory="assets"), name="assets")
 
 # Routers
 app.include_router(fish.router, prefix="/fish", tags=["fish"])
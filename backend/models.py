@@ -1,5 +1,5 @@
 # backend/models.py
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint, Text, Index
 from sqlalchemy.sql import func
 from backend.database import Base
 from sqlalchemy.orm import relationship
@@ -10,6 +10,11 @@ class Catch(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     image_path = Column(String, nullable=False)
+    # sha256 of the image bytes; rows sharing a blob share this hash (reference count)
+    image_hash = Column(String(64), nullable=True, index=True)
+    # WebP derivatives (see storage.DERIVATIVE_SIZES); NULL for catches uploaded before them
+    thumb_path = Column(String, nullable=True)
+    medium_path = Column(String, nullable=True)
     species_label = Column(String, nullable=False)
     species_confidence = Column(Float, nullable=False)
     user_id = Column(String, nullable=True, index=True)
@@ -18,15 +23,45 @@ class Catch(Base):
     # 地理位置
     lat = Column(Float, nullable=True)
     lng = Column(Float, nullable=True)
+    # Grid cell id (backend/geo.py) for bounding-box map queries; NULL without a position
+    geo_cell = Column(Integer, nullable=True, index=True)
     
     # 天气快照 (JSON string)
     weather_json = Column(Text, nullable=True)
 
+    # "pending" while upload/weather enrichment runs in the background, then "ready" (or "failed")
+    status = Column(String, nullable=False, default="ready", server_default="ready")
+
+    __table_args__ = (
+        # "my catches" keyset pages: WHERE user_id = ? AND id < ? ORDER BY id DESC
+        Index("ix_catches_user_id_id", "user_id", "id"),
+    )
+
+class GeoCluster(Base):
+    """
+    Pre-aggregated map clusters: catches per (zoom, grid cell, species), kept
+    up to date by catch_service on every insert/delete/relabel. Centroid of a
+    cell = sum_lat / catch_count, sum_lng / catch_count.
+    """
+    __tablename__ = "geo_clusters"
+
+    zoom = Column(Integer, primary_key=True)          # one of geo.CLUSTER_ZOOMS
+    cell = Column(Integer, primary_key=True)          # geo.cell_of(lat, lng, geo.zoom_deg(zoom))
+    species_label = Column(String, primary_key=True)
+    catch_count = Column(Integer, nullable=False, default=0)
+    sum_lat = Column(Float, nullable=False, default=0.0)
+    sum_lng = Column(Float, nullable=False, default=0.0)
+
+def _name_key_default(context):
+    return context.get_current_parameters()["common_name"].strip().lower()
+
 class Species(Base):
     __tablename__ = "species"
 
     id = Column(Integer, primary_key=True, index=True)
     common_name = Column(String, unique=True, index=True, nullable=False)
+    # lower(common_name): case-insensitive lookups and ON CONFLICT through a plain unique index
+    name_key = Column(String, unique=True, index=True, nullable=True, default=_name_key_default)
     sci_name = Column(String, nullable=True)
     icon_path = Column(String, nullable=True) # 可以存 emoji 🐟 或图片 URL
 
@@ -57,4 +92,41 @@ class UserSpecies(Base):
     # 确保每个用户对每种鱼只有一条记录
     __table_args__ = (
         UniqueConstraint("user_id", "species_id", name="uq_user_species"),
-    )
\ No newline at end of file
+    )
+
+class UserScore(Base):
+    """
+    Materialized leaderboard row, one per user: unique species collected and the
+    sum of their Species.points. Incremented by services/leaderboard_service.py
+    whenever a UserSpecies link is created; rebuilt by POST /admin/rebuild_leaderboard.
+    """
+    __tablename__ = "user_scores"
+
+    user_id = Column(String, primary_key=True)
+    species_count = Column(Integer, nullable=False, default=0)
+    points = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # top-N and rank: ORDER BY species_count DESC, points DESC, user_id
+        Index("ix_user_scores_rank", species_count.desc(), points.desc(), "user_id"),
+    )
+
+
+class IdempotencyRecord(Base):
+    """
+    Result of an ingest request made with a client-chosen key (offline sync local_id),
+    so a retried upload returns the original catch instead of creating a duplicate.
+    """
+    __tablename__ = "idempotency_records"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, nullable=False)
+    key = Column(String(128), nullable=False)
+    catch_id = Column(Integer, nullable=True)
+    response_json = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)  # TTL purge
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_user_key"),
+    )
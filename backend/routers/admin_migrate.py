@@ -1,8 +1,12 @@
 # backend/routers/admin_migrate.py
+from typing import List
+
 from fastapi import APIRouter, Depends
 from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
 from backend.database import get_db
+from backend.geo import cell_of
+from backend.services import cluster_service, leaderboard_service
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -22,3 +26,97 @@ def migrate(db: Session = Depends(get_db)):
         added.append("weather_json")
     db.commit()
     return {"added": added}
+
+
+# Columns/indexes added after the first deploy; create_all() only creates missing tables
+CATCH_COLUMNS = {
+    "image_hash": "VARCHAR(64)",
+    "thumb_path": "VARCHAR",
+    "medium_path": "VARCHAR",
+    "status": "VARCHAR NOT NULL DEFAULT 'ready'",
+    "geo_cell": "INTEGER",
+}
+SPECIES_COLUMNS = {
+    "name_key": "VARCHAR",
+}
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_catches_image_hash ON catches (image_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_catches_user_id_id ON catches (user_id, id)",
+    "CREATE INDEX IF NOT EXISTS ix_catches_geo_cell ON catches (geo_cell)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_species_name_key ON species (name_key)",
+]
+
+@router.post("/migrate_schema")
+def migrate_schema(db: Session = Depends(get_db)):
+    added = apply_schema(db)
+    backfilled = _backfill_geo_cells(db)
+    scored = leaderboard_service.backfill_if_empty(db)
+    db.commit()
+    return {"added": added, "geo_cells_backfilled": backfilled, "user_scores_backfilled": scored}
+
+
+def apply_schema(db: Session) -> List[str]:
+    """
+    Add missing CATCH_COLUMNS / SPECIES_COLUMNS, backfill species.name_key and create
+    INDEXES. Idempotent and cheap once applied, so startup runs it too (before the
+    species refs are warmed); the geo_cell backfill stays in /admin/migrate_schema.
+    Does not commit.
+    """
+    insp = inspect(db.bind)
+    added = []
+    for table, columns in (("catches", CATCH_COLUMNS), ("species", SPECIES_COLUMNS)):
+        cols = {c["name"] for c in insp.get_columns(table)}
+        for name, ddl in columns.items():
+            if name not in cols:
+                db.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                added.append(name if table == "catches" else f"{table}.{name}")
+    _backfill_name_keys(db)
+    for ddl in INDEXES:
+        db.execute(text(ddl))
+    return added
+
+
+def _backfill_name_keys(db: Session):
+    # Before its unique index exists. The old common_name index was case-sensitive, so
+    # "Bass" and "bass" may both exist: only the oldest row of each group gets the key
+    # (the others keep NULL, which the unique index allows, and stay reachable by name).
+    db.execute(text(
+        "UPDATE species SET name_key = LOWER(TRIM(common_name)) "
+        "WHERE name_key IS NULL "
+        "AND id = (SELECT MIN(s2.id) FROM species s2 "
+        "          WHERE LOWER(TRIM(s2.common_name)) = LOWER(TRIM(species.common_name))) "
+        "AND NOT EXISTS (SELECT 1 FROM species s3 WHERE s3.name_key = LOWER(TRIM(species.common_name)))"
+    ))
+
+
+@router.post("/rebuild_clusters")
+def rebuild_clusters(db: Session = Depends(get_db)):
+    """Recompute geo_clusters from all catches (the table itself is created by create_all())."""
+    rows = cluster_service.rebuild(db)
+    db.commit()
+    return {"cluster_rows": rows}
+
+
+def _backfill_geo_cells(db: Session, batch: int = 1000) -> int:
+    # Computed in Python: SQLite has no portable FLOOR()
+    done = 0
+    while True:
+        rows = db.execute(text(
+            "SELECT id, lat, lng FROM catches WHERE geo_cell IS NULL AND lat IS NOT NULL "
+            "AND lng IS NOT NULL AND NOT (lat = 0 AND lng = 0) LIMIT :n"
+        ), {"n": batch}).all()
+        if not rows:
+            return done
+        db.execute(
+            text("UPDATE catches SET geo_cell = :cell WHERE id = :id"),
+            [{"id": r.id, "cell": cell_of(r.lat, r.lng)} for r in rows],
+        )
+        done += len(rows)
+
+
+@router.post("/rebuild_leaderboard")
+def rebuild_leaderboard(db: Session = Depends(get_db)):
+    """Recompute user_scores from user_species (backfill, or after Species.points change)."""
+    users = leaderboard_service.rebuild(db)
+    db.commit()
+    return {"users": users}
@@ -1,30 +1,71 @@
 # backend/routers/catches.py
 #
 # ============== CHANGES FROM ORIGINAL ==============
-# 1. Line 5: Added IntegrityError import
-# 2. Line 93-114: Updated _apply_update_and_upsert with savepoint handling
+# 1. _apply_update_and_upsert links species via catch_service.link_species
+#    (INSERT .. ON CONFLICT DO NOTHING, no savepoints needed)
+# 2. AsyncSession (get_async_db): queries are awaited instead of blocking the
+#    event loop; service functions run through db.run_sync
+# 3. GET routes use get_read_db (read replicas, primary right after your own writes)
 # ===================================================
 
-from fastapi import APIRouter, Depends, HTTPException, status, Body, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError  # ✅ NEW: Added for race condition handling
+from sqlalchemy import or_, select
 from typing import List, Optional
-from pathlib import Path
+import base64
 
-from backend.database import get_db
-from backend import models, schemas
-from backend.storage import delete_image, is_supabase_url
+from backend.database import get_async_db, mark_user_wrote, writer
+from backend.routers.deps import get_read_db
+from backend import geo, models, schemas
 from backend.auth import AuthenticatedUser, get_current_user, get_optional_user
+from backend.services import catch_service, cluster_service
 
 router = APIRouter()
-UPLOADS_DIR = Path("assets/uploads").resolve()
+
+
+# --- Keyset (cursor) pagination ---
+# Pages are "id < last seen id ORDER BY id DESC LIMIT n": one index range scan,
+# whatever the depth, unlike OFFSET which reads and discards every skipped row.
+# The next page's cursor is returned in the X-Next-Cursor header (absent on the last page).
+
+def _encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        kind, _, value = raw.partition(":")
+        if kind != "id":
+            raise ValueError(raw)
+        return int(value)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def _page(db: AsyncSession, q, response: Response, limit: int, offset: int, before_id: Optional[int], cursor: Optional[str]):
+    if cursor:
+        before_id = _decode_cursor(cursor)
+    q = q.order_by(models.Catch.id.desc())
+    if before_id is not None:
+        q = q.filter(models.Catch.id < before_id)
+    elif offset:
+        q = q.offset(offset)  # deprecated fallback for old clients
+    rows = (await db.scalars(q.limit(limit))).all()
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].id)
+    return rows
 
 
 @router.get("/", response_model=List[schemas.CatchRead])
 async def list_catches(
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
     limit: int = Query(50, ge=1, le=500),
-    offset: int = 0,
+    offset: int = Query(0, ge=0, deprecated=True, description="Use cursor instead"),
+    before_id: Optional[int] = Query(None, description="Only catches with id < before_id"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
     user: Optional[AuthenticatedUser] = Depends(get_optional_user),
     mine_only: bool = False  # 新增参数，允许前端显式请求"我的鱼获"
 ):
@@ -32,8 +73,9 @@ async def list_catches(
     List catches. 
     - By default, returns recent catches (Community Feed).
     - If mine_only=True, returns only authenticated user's catches.
+    - Paginate with `cursor` (from the X-Next-Cursor response header) or `before_id`.
     """
-    q = db.query(models.Catch).order_by(models.Catch.id.desc())
+    q = select(models.Catch)
     
     if mine_only:
         if not user:
@@ -43,30 +85,102 @@ async def list_catches(
     # 这里我们移除了原来的逻辑： "if user: filter(user_id)". 
     # 原逻辑会导致登录用户无法查看广场数据。现在由 mine_only 控制。
     
-    return q.offset(offset).limit(limit).all()
+    return await _page(db, q, response, limit, offset, before_id, cursor)
 
 
 @router.get("/me", response_model=List[schemas.CatchRead])
 async def list_my_catches(
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
     limit: int = Query(50, ge=1, le=500),
-    offset: int = 0,
+    offset: int = Query(0, ge=0, deprecated=True, description="Use cursor instead"),
+    before_id: Optional[int] = Query(None, description="Only catches with id < before_id"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
     user: AuthenticatedUser = Depends(get_current_user),
 ):
     """
     Shortcut endpoint for authenticated user's catches.
+    Served by the (user_id, id) index.
     """
-    q = db.query(models.Catch).filter(
-        models.Catch.user_id == user.id
-    ).order_by(models.Catch.id.desc())
-    
-    return q.offset(offset).limit(limit).all()
+    q = select(models.Catch).filter(models.Catch.user_id == user.id)
+    return await _page(db, q, response, limit, offset, before_id, cursor)
+
+
+def _parse_bbox(bbox: str):
+    """"min_lng,min_lat,max_lng,max_lat" -> (min_lat, min_lng, max_lat, max_lng)"""
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lng,min_lat,max_lng,max_lat")
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+        raise HTTPException(status_code=400, detail="bbox out of range")
+    return min_lat, min_lng, max_lat, max_lng
+
+
+# Must be registered before /{catch_id}
+@router.get("/clusters", response_model=List[schemas.ClusterRead])
+async def list_catch_clusters(
+    zoom: int = Query(..., ge=0, le=22),
+    bbox: str = Query("-180,-90,180,90", description="min_lng,min_lat,max_lng,max_lat (min_lng > max_lng crosses the antimeridian)"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Marker clusters for zoomed-out map views: count, centroid and most common
+    species per grid cell. Read from pre-aggregated geo_clusters, so the cost
+    depends on the number of visible cells, not the number of catches.
+    Zoom in past the finest level (geo.CLUSTER_ZOOMS) and use /within for markers.
+    """
+    return await db.run_sync(cluster_service.clusters, zoom, _parse_bbox(bbox))
+
+
+@router.get("/within", response_model=List[schemas.CatchMarker])
+async def list_catches_within(
+    db: AsyncSession = Depends(get_read_db),
+    bbox: Optional[str] = Query(None, description="min_lng,min_lat,max_lng,max_lat (min_lng > max_lng crosses the antimeridian)"),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0, le=2000),
+    limit: int = Query(500, ge=1, le=2000),
+):
+    """
+    Map markers inside a bounding box, or within radius_km of lat/lng.
+    Newest first. Uses the geo_cell index: one range scan per grid row of the box.
+    """
+    if bbox:
+        min_lat, min_lng, max_lat, max_lng = _parse_bbox(bbox)
+    elif lat is not None and lng is not None and radius_km:
+        min_lat, min_lng, max_lat, max_lng = geo.radius_bbox(lat, lng, radius_km)
+    else:
+        raise HTTPException(status_code=400, detail="Pass bbox, or lat + lng + radius_km")
+
+    C = models.Catch
+    cells = or_(*(C.geo_cell.between(lo, hi) for lo, hi in geo.cell_ranges(min_lat, min_lng, max_lat, max_lng)))
+    in_lng = C.lng.between(min_lng, max_lng) if min_lng <= max_lng else or_(C.lng >= min_lng, C.lng <= max_lng)
+    q = (
+        select(C.id, C.lat, C.lng, C.species_label, C.thumb_path, C.created_at)
+        .filter(cells, C.lat.between(min_lat, max_lat), in_lng)
+        .order_by(C.id.desc())
+    )
+    if bbox:
+        return (await db.execute(q.limit(limit))).all()
+
+    # Radius: the box's corners lie outside the circle, so filter before limiting.
+    # Keyset pages through the box (newest first) until `limit` rows are in range.
+    rows, before_id = [], None
+    while len(rows) < limit:
+        page_q = q if before_id is None else q.filter(C.id < before_id)
+        page = (await db.execute(page_q.limit(limit))).all()
+        rows += [r for r in page if geo.haversine_km(lat, lng, r.lat, r.lng) <= radius_km]
+        if len(page) < limit:
+            break
+        before_id = page[-1].id
+    return rows[:limit]
 
 
 @router.get("/{catch_id}", response_model=schemas.CatchRead)
 async def get_catch(
     catch_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: Optional[AuthenticatedUser] = Depends(get_optional_user),
 ):
     """
@@ -75,7 +189,7 @@ async def get_catch(
     - If the catch has a user_id (Private/User owned), only the owner can view it.
     - (ADJUSTMENT: If you want all catches to be public read, remove the 403 block below)
     """
-    obj = db.query(models.Catch).filter(models.Catch.id == catch_id).first()
+    obj = await db.get(models.Catch, catch_id)
     if not obj:
         raise HTTPException(status_code=404, detail="Catch not found")
     
@@ -92,46 +206,25 @@ async def get_catch(
     return obj
 
 
-# ============== FIX: Updated with savepoints ==============
-def _apply_update_and_upsert(obj: models.Catch, payload: schemas.CatchUpdate, db: Session):
-    """Helper to apply updates and upsert species with race condition handling"""
+# ============== FIX: race-free species upsert ==============
+def _apply_update_and_upsert(db: Session, obj: models.Catch, payload: schemas.CatchUpdate):
+    """Helper to apply updates and upsert species with race condition handling (sync Session: run via run_sync)"""
     changed_label = False
     if payload.species_label is not None:
         new_label = (payload.species_label or "").strip()
         if new_label and new_label != obj.species_label:
+            # move the catch between species in the map clusters
+            cluster_service.bump(db, obj.lat, obj.lng, obj.species_label, -1)
+            cluster_service.bump(db, obj.lat, obj.lng, new_label, +1)
             obj.species_label = new_label
             changed_label = True
     if payload.species_confidence is not None:
         obj.species_confidence = float(payload.species_confidence)
+    mark_user_wrote(db, obj.user_id)
 
     # 如果修改了鱼种标签，自动更新图鉴
     if changed_label and obj.user_id and obj.species_label:
-        sp = db.query(models.Species).filter(models.Species.common_name.ilike(obj.species_label)).first()
-        
-        if sp is None:
-            # ✅ FIX: Use savepoint to handle race condition
-            try:
-                with db.begin_nested():  # SAVEPOINT
-                    sp = models.Species(common_name=obj.species_label)
-                    db.add(sp)
-                    db.flush()
-            except IntegrityError:
-                # Another request created it - fetch it
-                sp = db.query(models.Species).filter(
-                    models.Species.common_name.ilike(obj.species_label)
-                ).first()
-        
-        if sp:
-            link = db.query(models.UserSpecies).filter_by(user_id=obj.user_id, species_id=sp.id).first()
-            if link is None:
-                # ✅ FIX: Use savepoint
-                try:
-                    with db.begin_nested():  # SAVEPOINT
-                        db.add(models.UserSpecies(user_id=obj.user_id, species_id=sp.id))
-                        db.flush()
-                except IntegrityError:
-                    # Already exists - that's fine
-                    pass
+        catch_service.link_species(db, obj.user_id, obj.species_label)
 # ==========================================================
 
 
@@ -139,22 +232,23 @@ def _apply_update_and_upsert(obj: models.Catch, payload: schemas.CatchUpdate, db
 async def update_catch(
     catch_id: int,
     payload: schemas.CatchUpdate = Body(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: AuthenticatedUser = Depends(get_current_user),
 ):
     """
     Update a catch. Only owner can update.
     """
-    obj = db.query(models.Catch).filter(models.Catch.id == catch_id).first()
+    obj = await db.get(models.Catch, catch_id)
     if not obj:
         raise HTTPException(status_code=404, detail="Catch not found")
     
     if obj.user_id != user.id:
         raise HTTPException(status_code=403, detail="Forbidden - not your catch")
 
-    _apply_update_and_upsert(obj, payload, db)
-    db.commit()
-    db.refresh(obj)
+    async with writer():
+        await db.run_sync(_apply_update_and_upsert, obj, payload)
+        await db.commit()
+    await db.refresh(obj)
     return obj
 
 
@@ -162,7 +256,7 @@ async def update_catch(
 async def update_catch_put(
     catch_id: int,
     payload: schemas.CatchUpdate = Body(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: AuthenticatedUser = Depends(get_current_user),
 ):
     return await update_catch(catch_id, payload, db, user)
@@ -171,31 +265,18 @@ async def update_catch_put(
 @router.delete("/{catch_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_catch(
     catch_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: AuthenticatedUser = Depends(get_current_user),
 ):
     """
     Delete a catch. Only owner can delete.
     """
-    catch = db.query(models.Catch).filter(models.Catch.id == catch_id).first()
+    catch = await db.get(models.Catch, catch_id)
     if catch is None:
         raise HTTPException(status_code=404, detail="Catch not found")
     
     if catch.user_id != user.id:
         raise HTTPException(status_code=403, detail="Forbidden - not your catch")
 
-    # Delete image logic
-    if catch.image_path:
-        try:
-            if is_supabase_url(catch.image_path):
-                delete_image(catch.image_path)
-            else:
-                rel = catch.image_path.lstrip("/")
-                candidate = Path(rel).resolve()
-                if candidate.is_file() and UPLOADS_DIR in candidate.parents:
-                    candidate.unlink(missing_ok=True)
-        except Exception:
-            pass  # Don't fail delete if image cleanup fails
-
-    db.delete(catch)
-    db.commit()
+    # Deletes the row, and the image once no other catch references it
+    await catch_service.delete_catch_async(db, catch)
@@ -0,0 +1,15 @@
+# backend/routers/deps.py
+# Request-level dependencies shared by the routers (kept out of backend.database
+# so the DB layer doesn't import auth).
+from typing import Optional
+
+from fastapi import Depends
+
+from backend.auth import AuthenticatedUser, get_optional_user
+from backend.database import read_session
+
+
+# For read-only (GET) routes: SELECTs go to a replica, unless the caller wrote recently
+async def get_read_db(user: Optional[AuthenticatedUser] = Depends(get_optional_user)):
+    async with read_session(user.id if user else None) as db:
+        yield db
@@ -1,19 +1,21 @@
 # backend/routers/fish.py
 # Refactored to use Service Layer (catch_service)
 # Removes direct DB logic from the router
+# No per-request DB session: each DB step opens session_scope() for just that
+# step, so no pooled connection is held through upload reads, inference or the
+# background upload/weather stage (guest calls never touch the pool).
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, status, Depends, Form
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, HTTPException, status, Depends, Form, Header
 from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from typing import List, Optional
+import json
 import logging
-import httpx
-import os
-import uuid
 
-from backend.database import get_db
-from backend.storage import upload_image
+from backend.database import session_scope
 from backend.auth import AuthenticatedUser, get_current_user, get_optional_user
-from backend.services import catch_service  # ✅ 引入新的 Service
+from backend.services import catch_service, enrich_service, idempotency_service  # ✅ 引入新的 Service
+from backend.services.upload_service import BATCH_MAX_ITEMS, read_image_upload
 from ml import predict
 
 router = APIRouter()
@@ -21,69 +23,89 @@ router = APIRouter()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-ALLOWED_TYPES = {"image/jpeg", "image/png", "image/webp"}
-MAX_BYTES = 6 * 1024 * 1024  # 6 MB
 
-# Local storage fallback config
-SAVE_DIR = os.path.join("assets", "uploads")
-os.makedirs(SAVE_DIR, exist_ok=True)
-EXT_FOR = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+def _needs_reupload(prior: dict) -> bool:
+    """A replayed catch that failed without an image (see enrich_service.settle_stale): the retry's photo is stored for it."""
+    return prior.get("catch_id") is not None and prior.get("status") == "failed" and not prior.get("saved_path")
 
 
-# --- Helper Functions (可以考虑未来移入 utils 或 weather_service) ---
-
-async def fetch_weather(lat: float, lng: float) -> Optional[dict]:
-    """Minimal current-conditions snapshot via Open-Meteo."""
-    try:
-        url = (
-            "https://api.open-meteo.com/v1/forecast"
-            f"?latitude={lat}&longitude={lng}"
-            "&current=temperature_2m,relative_humidity_2m,wind_speed_10m,wind_direction_10m,weather_code"
-        )
-        async with httpx.AsyncClient(timeout=8) as client:
-            r = await client.get(url)
-            if r.status_code == 200:
-                return r.json()
-    except Exception as e:
-        logger.warning("Weather fetch failed: %s", e)
-    return None
-
-def save_image_local(contents: bytes, content_type: str) -> str:
-    """Fallback: save image to local disk"""
-    uid = uuid.uuid4().hex
-    ext = EXT_FOR.get(content_type, ".jpg")
-    filename = uid + ext
-    abs_path = os.path.join(SAVE_DIR, filename)
-    with open(abs_path, "wb") as f:
-        f.write(contents)
-    return f"/assets/uploads/{filename}"
+def _catch_response(catch, result: dict, file_name: Optional[str]) -> dict:
+    """Response body for a saved catch (saved_path/weather are null while status == "pending")."""
+    return {
+        "file_name": file_name,
+        "saved_path": catch.image_path or None,
+        "thumb_path": catch.thumb_path,
+        "medium_path": catch.medium_path,
+        "prediction": result,
+        "catch_id": catch.id,
+        "status": catch.status,
+        "created_at": catch.created_at.isoformat(),
+        "lat": catch.lat,
+        "lng": catch.lng,
+        "weather": None,
+        "authenticated": True,
+        "user_id": catch.user_id,
+    }
 
 
 # --- API Endpoints ---
 
 @router.post("/identify")
 async def identify_fish(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     persist: bool = Form(True),
     latitude: Optional[float] = Form(None),
     longitude: Optional[float] = Form(None),
-    db: Session = Depends(get_db),
+    local_id: Optional[str] = Form(None),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     user: Optional[AuthenticatedUser] = Depends(get_optional_user),
 ):
     """
     Standard Identification Endpoint.
     Supports both guest (no-save) and authenticated (save) users.
+    Saving replies as soon as the prediction is ready and the catch is reserved;
+    image upload and weather run in the background (catch status "pending" -> "ready").
+    With an Idempotency-Key header (or local_id field), a retried save returns the
+    first attempt's response ("replayed": true) without inference or storage work.
     """
-    # 1. 基础校验
-    if file.content_type not in ALLOWED_TYPES:
-        raise HTTPException(415, detail=f"Unsupported type: {file.content_type}")
-    
-    contents = await file.read()
-    if len(contents) > MAX_BYTES:
-        raise HTTPException(413, detail="File too large (>6MB)")
+    # 0. 重试: same key as an earlier save -> same answer, nothing re-done
+    try:
+        key = idempotency_service.normalize_key(idempotency_key or local_id)
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+    if not (user and persist):
+        key = None  # nothing is saved, so there is nothing to deduplicate
+    elif enrich_service.sweep_due():
+        background_tasks.add_task(enrich_service.settle_stale)
+    prior = None
+    if key:
+        if idempotency_service.purge_due():
+            background_tasks.add_task(idempotency_service.purge_in_background)
+        async with session_scope() as db:
+            prior = (await db.run_sync(idempotency_service.lookup, user.id, [key])).get(key)
+        if prior is not None and not _needs_reupload(prior):
+            return {**prior, "replayed": True}
+
+    # 1. 基础校验: read in chunks -> 415 on non-image magic bytes, 413 past 6MB;
+    #    the sha256 is computed in the same pass (shared by prediction cache and blob storage)
+    upload = await read_image_upload(file)
+    contents, digest = upload.data, upload.sha256
+
+    if prior is not None:
+        # The first attempt's catch failed without an image: store this copy for it
+        async with session_scope(write=True) as db:
+            reopened = await db.run_sync(catch_service.reopen_failed, prior["catch_id"], digest)
+        if not reopened:
+            return {**prior, "replayed": True}
+        background_tasks.add_task(
+            enrich_service.enrich_catch,
+            prior["catch_id"], contents, upload.content_type, digest, prior.get("lat"), prior.get("lng"),
+        )
+        return {**prior, "status": "pending", "replayed": True}
 
     # 2. AI 推理 (核心功能)
-    result = predict.run_inference(contents)
+    result = await predict.run_inference_async(contents, digest)
     label = (result.get("label") or "Unknown").strip()
     conf = float(result.get("confidence") or 0.0)
 
@@ -100,59 +122,216 @@ async def identify_fish(
             "authenticated": bool(user_id),
         }
 
-    # 4. 图片存储 (Storage Layer)
-    try:
-        # 优先尝试云存储，失败降级到本地
-        image_url = upload_image(contents, file.content_type)
-        if not image_url:
-            image_url = save_image_local(contents, file.content_type)
-    except Exception as e:
-        logger.error(f"Upload failed: {e}")
-        image_url = save_image_local(contents, file.content_type)
-
-    # 5. 获取天气 (External API)
-    weather = None
-    if latitude is not None and longitude is not None:
-        weather = await fetch_weather(latitude, longitude)
-
-    # 6. ✅ 核心改动：调用 Service 层处理业务逻辑
-    #    不再在这里写 models.Catch(...)
-    try:
-        catch = catch_service.create_catch(
+    needs_weather = latitude is not None and longitude is not None
+
+    def save(db: Session):
+        # 4. 图片存储 (Storage Layer)
+        # Content-addressed: if this exact photo is already stored, reuse it (no write/upload)
+        stored = catch_service.find_stored_image(db, digest)
+
+        # 5. ✅ 核心改动：调用 Service 层处理业务逻辑
+        #    Reserve the catch now; upload + weather are filled in by the background stage.
+        #    The idempotency record commits in the same transaction as the catch.
+        catch = catch_service.add_catch(
             db=db,
             user_id=user_id,
-            image_path=image_url,
+            image_path=stored.image_path if stored else "",
+            image_hash=digest,
+            derivatives={"thumb": stored.thumb_path, "medium": stored.medium_path} if stored else None,
             species_label=label,
             species_confidence=conf,
             lat=latitude,
             lng=longitude,
-            weather_data=weather
+            status="pending" if stored is None or needs_weather else "ready",
         )
-    except Exception as e:
-        raise HTTPException(500, detail=f"Service error: {str(e)}")
+        response = _catch_response(catch, result, file.filename)
+        if key:
+            idempotency_service.record(db, user_id, key, catch.id, response)
+        db.commit()
+        return catch, response, stored is None
 
-    # 7. 返回结果
+    # The only connection this request holds: the short reserve transaction
+    async with session_scope(write=True) as db:
+        try:
+            catch, response, needs_upload = await db.run_sync(save)
+        except IntegrityError:
+            # A concurrent request with the same key committed first: answer with its result
+            await db.rollback()
+            prior = (await db.run_sync(idempotency_service.lookup, user_id, [key])).get(key) if key else None
+            if prior is None:
+                raise HTTPException(409, detail="A request with this Idempotency-Key is in progress; retry")
+            return {**prior, "replayed": True}
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(500, detail=f"Service error: {str(e)}")
+
+    # 6. 后台：图片上传 + 天气 (并发), then patch the row
+    if catch.status == "pending":
+        background_tasks.add_task(
+            enrich_service.enrich_catch,
+            catch.id,
+            contents if needs_upload else None,
+            upload.content_type,
+            digest,
+            latitude,
+            longitude,
+        )
+
+    # 7. 返回结果 (saved_path/weather are null while status == "pending"; poll GET /catches/{id})
+    return response
+
+
+@router.post("/identify-batch")
+async def identify_fish_batch(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    items: str = Form("[]", description='JSON array, one object per file: {"idempotency_key", "latitude", "longitude"}'),
+    user: AuthenticatedUser = Depends(get_current_user),
+):
+    """
+    Offline sync: save many catches in one request.
+    - items[i] describes files[i]; idempotency_key (or local_id) makes retries safe:
+      an already-ingested key returns its original result ("replayed": true)
+    - inference for all images is submitted at once and runs as one micro-batch
+    - all catches, species links and idempotency records are one transaction
+    - uploads and weather for every catch run concurrently in the background
+    Per-item failures (type, size, inference) are reported in results[i].error.
+    """
+    if len(files) > BATCH_MAX_ITEMS:
+        raise HTTPException(413, detail=f"At most {BATCH_MAX_ITEMS} files per batch")
+    try:
+        meta = json.loads(items or "[]") or [{} for _ in files]
+        if not isinstance(meta, list) or len(meta) != len(files) or not all(isinstance(m, dict) for m in meta):
+            raise ValueError("items must be a JSON array with one object per file")
+        keys = [idempotency_service.normalize_key(m.get("idempotency_key") or m.get("local_id")) for m in meta]
+        coords = [
+            (float(m["latitude"]) if m.get("latitude") is not None else None,
+             float(m["longitude"]) if m.get("longitude") is not None else None)
+            for m in meta
+        ]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(400, detail=f"Invalid items: {e}")
+
+    results: List[Optional[dict]] = [None] * len(files)
+    if any(keys) and idempotency_service.purge_due():
+        background_tasks.add_task(idempotency_service.purge_in_background)
+    if enrich_service.sweep_due():
+        background_tasks.add_task(enrich_service.settle_stale)
+    replayed = {}
+    if any(keys):
+        async with session_scope() as db:
+            replayed = await db.run_sync(idempotency_service.lookup, user.id, keys)
+    first_index = {}   # key -> first item in this batch using it
+    todo = []          # (index, ImageUpload)
+    reuploads = []     # (index, ImageUpload) for replayed catches that failed without an image
+    for i, f in enumerate(files):
+        key = keys[i]
+        if key in replayed:
+            if key in first_index:
+                continue  # the same failed catch again: copied from the first one below
+            results[i] = {**replayed[key], "replayed": True}
+            if _needs_reupload(replayed[key]):
+                first_index[key] = i
+                try:
+                    reuploads.append((i, await read_image_upload(f)))
+                except HTTPException:
+                    pass  # keep the replayed "failed" result; the client can retry again
+            continue
+        if key and key in first_index:
+            continue  # duplicate inside the batch: copied from the first one below
+        if key:
+            first_index[key] = i
+        try:
+            todo.append((i, await read_image_upload(f)))
+        except HTTPException as e:  # 415 / 413 / 400 for this item only
+            results[i] = {"error": e.detail, "status_code": e.status_code}
+
+    # Queued together, so the micro-batcher runs them as full batches.
+    # InferenceBusy propagates (503): nothing is saved yet, the client retries the batch.
+    preds = await predict.run_inference_many_async(
+        [u.data for _, u in todo], [u.sha256 for _, u in todo]
+    ) if todo else []
+
+    jobs = []
+
+    def save(db: Session):
+        stored = catch_service.find_stored_images(db, [u.sha256 for _, u in todo])
+        for (i, upload), result in zip(todo, preds):
+            digest = upload.sha256
+            if isinstance(result, Exception):
+                logger.warning(f"Batch item {i} inference failed: {result}")
+                results[i] = {"error": "Could not process image", "status_code": 422}
+                continue
+            lat, lng = coords[i]
+            hit = stored.get(digest)
+            catch = catch_service.add_catch(
+                db,
+                user.id,
+                image_path=hit.image_path if hit else "",
+                image_hash=digest,
+                derivatives={"thumb": hit.thumb_path, "medium": hit.medium_path} if hit else None,
+                species_label=(result.get("label") or "Unknown").strip(),
+                species_confidence=float(result.get("confidence") or 0.0),
+                lat=lat,
+                lng=lng,
+                status="pending" if hit is None or (lat is not None and lng is not None) else "ready",
+            )
+            results[i] = _catch_response(catch, result, files[i].filename)
+            if keys[i]:
+                idempotency_service.record(db, user.id, keys[i], catch.id, results[i])
+            if catch.status == "pending":
+                jobs.append({
+                    "catch_id": catch.id, "contents": upload.data if hit is None else None,
+                    "content_type": upload.content_type, "digest": digest, "lat": lat, "lng": lng,
+                })
+        db.commit()
+
+    if todo:
+        async with session_scope(write=True) as db:
+            try:
+                await db.run_sync(save)
+            except IntegrityError:
+                await db.rollback()
+                raise HTTPException(409, detail="An idempotency key in this batch is already being processed; retry")
+            except SQLAlchemyError as e:
+                await db.rollback()
+                raise HTTPException(500, detail=f"Service error: {str(e)}")
+
+    if reuploads:
+        async with session_scope(write=True) as db:
+            for i, upload in reuploads:
+                prior = results[i]
+                if await db.run_sync(catch_service.reopen_failed, prior["catch_id"], upload.sha256):
+                    results[i] = {**prior, "status": "pending"}
+                    jobs.append({
+                        "catch_id": prior["catch_id"], "contents": upload.data, "content_type": upload.content_type,
+                        "digest": upload.sha256, "lat": prior.get("lat"), "lng": prior.get("lng"),
+                    })
+
+    if jobs:
+        background_tasks.add_task(enrich_service.enrich_catches, jobs)
+
+    for i, key in enumerate(keys):
+        if results[i] is None:  # duplicate key inside the batch
+            results[i] = {**results[first_index[key]], "replayed": True}
+        results[i] = {"replayed": False, **results[i], "index": i, "idempotency_key": key}
     return {
-        "file_name": file.filename,
-        "saved_path": image_url,
-        "prediction": result,
-        "catch_id": catch.id,
-        "created_at": catch.created_at.isoformat(),
-        "lat": catch.lat,
-        "lng": catch.lng,
-        "weather": weather,
-        "authenticated": True,
-        "user_id": user_id,
+        "results": results,
+        "created": sum(1 for r in results if r.get("catch_id") and not r["replayed"]),
+        "replayed": sum(1 for r in results if r["replayed"]),
+        "failed": sum(1 for r in results if "error" in r),
     }
 
 # 保留 Protected 接口 (如果前端还在用)
 @router.post("/identify-protected")
 async def identify_fish_protected(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     persist: bool = Form(True),
     latitude: Optional[float] = Form(None),
     longitude: Optional[float] = Form(None),
-    db: Session = Depends(get_db),
+    local_id: Optional[str] = Form(None),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     user: AuthenticatedUser = Depends(get_current_user), # 强制登录
 ):
     # 复用逻辑 (为了不重复代码，真实项目中通常会提取公共函数 _process_identification)
@@ -163,10 +342,12 @@ async def identify_fish_protected(
     
     # 暂时抛出一个指向 /identify 的提示，或者你可以直接复制上面的逻辑
     return await identify_fish(
+        background_tasks=background_tasks,
         file=file, 
         persist=persist, 
         latitude=latitude, 
         longitude=longitude, 
-        db=db, 
+        local_id=local_id,
+        idempotency_key=idempotency_key,
         user=user
     )
\ No newline at end of file
@@ -1,12 +1,18 @@
 # backend/routers/predict.py
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 import hashlib, json
 
+from backend.auth import AuthenticatedUser, get_current_user
+from backend.services.upload_service import read_image_upload
+
 # our ML inference
-from ml.predict import run_inference
+from ml.predict import run_inference_async
+from ml.batching import get_batcher
+from ml.executor import InferenceBusy, get_executor
+from ml.cache import get_cache
 
 router = APIRouter(tags=["ml"])
 
@@ -21,16 +27,21 @@ def sha1_bytes(b: bytes) -> str:
 
 @router.post("/predict")
 async def predict(file: UploadFile = File(...)):
-    raw = await file.read()
-    if not raw:
-        raise HTTPException(400, "Empty file")
+    upload = await read_image_upload(file, want_sha1=True)  # 415/413/400 before any inference
     try:
-        out = run_inference(raw)        # uses ONNX/Torch/Mock automatically
-        out["image_sha1"] = sha1_bytes(raw)
+        out = await run_inference_async(upload.data, upload.sha256)  # uses ONNX/Torch/Mock automatically
+        out["image_sha1"] = upload.sha1
         return out
+    except InferenceBusy:
+        raise  # -> 503 + Retry-After (see main.py)
     except Exception as e:
         raise HTTPException(500, f"predict failed: {e}")
 
+@router.get("/predict/stats")
+def predict_stats(user: AuthenticatedUser = Depends(get_current_user)):
+    """Micro-batching metrics (batch sizes, queue wait), executor load and cache hit rate."""
+    return {**get_batcher().stats(), "executor": get_executor().stats(), "cache": get_cache().stats()}
+
 class FeedbackIn(BaseModel):
     image_sha1: str
     chosen_species_id: str
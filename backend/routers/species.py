@@ -6,14 +6,17 @@
 # 3. Line 250: Use escape_like to prevent SQL injection via wildcards
 # ===================================================
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import re  # ✅ NEW: For escape_like
 
 from backend.database import get_db
+from backend.routers.deps import get_read_db
 from backend import models, schemas
 from backend.auth import AuthenticatedUser, get_current_user
+from backend.services import catalog_service, collection_service, species_service
 
 
 # ============== FIX: LIKE escape helper ==============
@@ -449,65 +452,51 @@ FULL_FISH_DATA = [
 # =================================================================
 
 @router.get("/", response_model=List[schemas.SpeciesRead])
-def list_species(
-    db: Session = Depends(get_db),
+async def list_species(
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
     q: Optional[str] = Query(None, description="Search species by name", max_length=100),
     limit: int = 500,
 ):
     """
     Get all species in the whitelist. 
     This is what the frontend uses to populate the 'Fish Index'.
+    Served from the in-memory catalog snapshot (pre-serialized, gzip when
+    accepted) with an ETag; If-None-Match returns 304.
     """
-    query = db.query(models.Species)
-    if q:
-        # ✅ FIX: Escape LIKE wildcards to prevent SQL injection
-        safe_q = escape_like(q.strip())
-        query = query.filter(models.Species.common_name.ilike(f"%{safe_q}%"))
-    return query.order_by(models.Species.common_name.asc()).limit(limit).all()
+    snap = await db.run_sync(catalog_service.get_snapshot)  # no query unless the snapshot is stale
+    items = snap.search(q, limit)
+    if len(items) == len(snap.fragments):
+        body, etag = snap.body, snap.etag
+    else:
+        body = b"[" + b",".join(items) + b"]"
+        etag = catalog_service.etag_of(body)
+
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60", "Vary": "Accept-Encoding"}
+    if etag in (t.strip() for t in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    if body is snap.body and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=snap.body_gzip, media_type="application/json", headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.get("/my-collection", response_model=schemas.UserCollectionRead)
-def get_my_collection(
-    db: Session = Depends(get_db),
+async def get_my_collection(
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
     user: AuthenticatedUser = Depends(get_current_user),
 ):
     """
     Get the authenticated user's collection status.
     Combines the whitelist with user's catch records.
+    Send the last ETag as If-None-Match to get 304 when nothing changed.
     """
-    return get_user_collection_logic(user.id, db)
-
-
-def get_user_collection_logic(user_id: str, db: Session):
-    # 1. 获取所有白名单鱼种
-    all_species = db.query(models.Species).order_by(models.Species.common_name.asc()).all()
-    
-    # 2. 获取用户已捕获的记录 (UserSpecies 关联表)
-    rows = db.query(models.UserSpecies).filter(models.UserSpecies.user_id == user_id).all()
-    caught_map = {r.species_id: r.first_catch_at for r in rows}
-
-    entries = []
-    caught_count = 0
-    for sp in all_species:
-        is_caught = sp.id in caught_map
-        if is_caught:
-            caught_count += 1
-        
-        entries.append(schemas.CollectionEntry(
-            id=sp.id,
-            common_name=sp.common_name,
-            sci_name=sp.sci_name,
-            icon_path=sp.icon_path,
-            caught=is_caught,
-            first_catch_at=caught_map.get(sp.id),
-        ))
-
-    return schemas.UserCollectionRead(
-        user_id=user_id,
-        total=len(all_species),
-        caught=caught_count,
-        species=entries,
-    )
+    body, etag = await db.run_sync(collection_service.get_collection, user.id)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in (t.strip() for t in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.post("/seed", response_model=List[schemas.SpeciesRead])
@@ -520,24 +509,40 @@ def seed_species(db: Session = Depends(get_db)):
     - If a fish doesn't exist in DB: Create it.
     - If a fish exists: Update its details (rarity, points, etc.) to match the whitelist.
     - Idempotent: Can be called multiple times safely.
+    Single bulk upsert; see /seed/bulk for the diff and the CSV/JSON catalogs.
+    """
+    species_service.bulk_upsert(db, FULL_FISH_DATA)
+    db.commit()
+    by_name = {sp.common_name.lower(): sp for sp in db.query(models.Species).all()}
+    return [by_name[d["common_name"].lower()] for d in FULL_FISH_DATA]
+
+
+@router.post("/seed/bulk")
+def seed_species_bulk(
+    db: Session = Depends(get_db),
+    source: str = Query("builtin", description="Comma-separated, applied in order: builtin, csv, json"),
+):
     """
-    out = []
-    for sp_data in FULL_FISH_DATA:
-        # Case-insensitive lookup
-        obj = db.query(models.Species).filter(models.Species.common_name.ilike(sp_data["common_name"])).first()
-        
-        if not obj:
-            # Create new
-            obj = models.Species(**sp_data)
-            db.add(obj)
-        else:
-            # Update existing (ensures DB stays in sync with code)
-            for key, value in sp_data.items():
-                if hasattr(obj, key):
-                    setattr(obj, key, value)
-        
-        db.flush()
-        out.append(obj)
-        
+    Bulk sync from one or more catalogs: the in-code whitelist, ml/data/species_ma.csv
+    and/or fishing-mobile/assets/species/species_na.json. Earlier sources win; later
+    ones only fill in missing fields, and without builtin the catalogs never overwrite
+    a stored value. Returns which species were created/updated/unchanged.
+    """
+    names = [s.strip() for s in source.split(",") if s.strip()]
+    unknown = [n for n in names if n not in species_service.SOURCES]
+    if not names or unknown:
+        raise HTTPException(status_code=400, detail=f"source must be from {', '.join(species_service.SOURCES)}")
+
+    loaders = {
+        "builtin": lambda: FULL_FISH_DATA,
+        "csv": species_service.load_csv,
+        "json": species_service.load_json,
+    }
+    try:
+        entries = species_service.merge(*(loaders[n]() for n in names))
+    except (OSError, KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read catalog: {e}")
+
+    diff = species_service.bulk_upsert(db, entries, fill_only="builtin" not in names)
     db.commit()
-    return out
+    return {"source": names, **{k: len(v) for k, v in diff.items()}, "created_names": diff["created"], "updated_names": diff["updated"]}
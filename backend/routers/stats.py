@@ -1,34 +1,52 @@
 # backend/routers/stats.py
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Dict
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, List, Dict
 
-from backend.database import get_db
-from backend import models
+from backend.auth import AuthenticatedUser, get_current_user, get_token_cache
+from backend.database import async_pool_stats, pool_stats, replica_pool_stats
+from backend.routers.deps import get_read_db
+from backend.services import leaderboard_service
 
 router = APIRouter(prefix="/stats", tags=["stats"])
 
 @router.get("/users-unique-species")
-def users_unique_species(
-    db: Session = Depends(get_db),
+async def users_unique_species(
+    db: AsyncSession = Depends(get_read_db),
     limit: int = Query(100, ge=1, le=1000),
-) -> List[Dict[str, int]]:
+) -> List[Dict[str, Any]]:
     """
-    Leaderboard: users ranked by count of unique species they've collected.
-    Uses user_species (already maintained on create/update).
+    Leaderboard: users ranked by count of unique species they've collected
+    (ties broken by species points). Top-N read of the materialized user_scores
+    table, maintained whenever a user_species link is created.
     """
-    q = (
-        db.query(
-            models.UserSpecies.user_id.label("user_id"),
-            func.count(func.distinct(models.UserSpecies.species_id)).label("uniq_species_count"),
-        )
-        .group_by(models.UserSpecies.user_id)
-        .order_by(func.count(func.distinct(models.UserSpecies.species_id)).desc())
-        .limit(limit)
-    )
-    rows = q.all()
+    rows = await db.run_sync(leaderboard_service.top, limit)
     return [
-        {"user_id": r.user_id, "uniq_species_count": int(r.uniq_species_count)}
+        {"user_id": r.user_id, "uniq_species_count": r.species_count, "points": r.points}
         for r in rows
     ]
+
+
+@router.get("/users/{user_id}/rank")
+async def user_rank(user_id: str, db: AsyncSession = Depends(get_read_db)) -> Dict[str, Any]:
+    """A single user's leaderboard position, without loading the leaderboard."""
+    row = await db.run_sync(leaderboard_service.rank, user_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="User has no species yet")
+    return row
+
+
+@router.get("/auth-cache")
+def auth_cache_stats(user: AuthenticatedUser = Depends(get_current_user)) -> Dict[str, Any]:
+    """Verified-token cache: entries and hit rate (negative_hits = rejected tokens served from cache)."""
+    return get_token_cache().stats()
+
+
+@router.get("/db-pool")
+def db_pool_stats(user: AuthenticatedUser = Depends(get_current_user)) -> Dict[str, Any]:
+    """Connection pools: checked out now / peak, and how long scoped sessions waited for a connection."""
+    return {
+        "async": async_pool_stats.stats(),
+        "sync": pool_stats.stats(),
+        "replicas": [p.stats() for p in replica_pool_stats],
+    }
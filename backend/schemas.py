@@ -1,5 +1,5 @@
 # backend/schemas.py
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import Optional, List, Any
 from datetime import datetime
 
@@ -18,7 +18,9 @@ class CatchUpdate(CatchBase):
 
 class CatchRead(CatchBase):
     id: int
-    image_path: str
+    image_path: Optional[str] = None  # null while status is "pending" (and if "failed")
+    thumb_path: Optional[str] = None   # 128px WebP, for cards/markers
+    medium_path: Optional[str] = None  # 512px WebP, for detail views
     species_label: Optional[str] = None
     species_confidence: Optional[float] = None
     created_at: datetime
@@ -26,10 +28,39 @@ class CatchRead(CatchBase):
     lat: Optional[float] = None
     lng: Optional[float] = None
     weather_json: Optional[str] = None  # Raw JSON string
+    status: str = "ready"  # "pending" until the background upload/weather stage finishes
+
+    # reserved rows store "" until the image is stored (the column is NOT NULL)
+    @field_validator("image_path", mode="before")
+    @classmethod
+    def _no_blob_yet(cls, v):
+        return v or None
+
+    class Config:
+        from_attributes = True
+
+class CatchMarker(BaseModel):
+    """Lightweight catch for map markers."""
+    id: int
+    lat: float
+    lng: float
+    species_label: Optional[str] = None
+    thumb_path: Optional[str] = None
+    created_at: datetime
 
     class Config:
         from_attributes = True
 
+class ClusterRead(BaseModel):
+    """One map cluster: all catches in a grid cell at the requested zoom."""
+    cell: int
+    zoom: int                  # maintained zoom level actually used
+    count: int
+    lat: float                 # centroid
+    lng: float
+    top_species: Optional[str] = None
+    top_species_count: int = 0
+
 # --- Species Schemas ---
 
 class SpeciesRead(BaseModel):
@@ -0,0 +1,175 @@
+# backend/services/catalog_service.py
+#
+# In-process snapshot of the species catalog for GET /species.
+# The catalog only changes through /species/seed and the occasional species
+# auto-created by a catch, so instead of re-querying and re-serializing every
+# row (description, habitat, bait ...) per request we keep:
+#   - each species pre-serialized as a JSON fragment, sorted by common_name
+#   - the full list as JSON and gzip bytes with a content-hash ETag
+#   - casefolded names for in-memory substring search (replaces ILIKE '%q%')
+# Commits that change species call mark_dirty(); the snapshot is rebuilt on the
+# next read and `version` increases. CATALOG_TTL bounds staleness in other
+# worker processes.
+#
+# It also caches name_key -> (species id, points) for the catch write path, so
+# resolving a predicted label costs no query. Ids never change; points only
+# change through /species/seed, which clears the cache in this process.
+# (A species auto-created by a catch only adds to it.)
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from backend import models, schemas
+from backend.database import PRIMARY
+from backend.services import collection_service
+
+CATALOG_TTL_S = float(os.getenv("CATALOG_TTL", "300"))
+
+_DIRTY = "catalog_dirty"
+_PENDING_REFS = "catalog_pending_refs"
+
+SpeciesRef = Tuple[int, int]  # (species id, points)
+
+
+def name_key(name: str) -> str:
+    """Normalized species name (species.name_key): case-insensitive lookups through a plain unique index."""
+    return name.strip().lower()
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    fragments: List[bytes]   # one JSON object per species, ordered by common_name
+    names: List[str]         # casefolded common_name, same order
+    body: bytes              # JSON array of all species
+    body_gzip: bytes
+    etag: str
+    expires: float
+
+    def search(self, q: Optional[str], limit: int) -> List[bytes]:
+        """Case-insensitive substring match on common_name, in name order (same as the old ILIKE)."""
+        if not q:
+            return self.fragments[:limit]
+        needle = q.strip().casefold()
+        return [f for f, name in zip(self.fragments, self.names) if needle in name][:limit]
+
+
+def etag_of(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+_lock = threading.Lock()
+_version = 0
+_snapshot: Optional[CatalogSnapshot] = None
+_refs: Dict[str, SpeciesRef] = {}
+
+
+def invalidate(clear_refs: bool = True) -> None:
+    global _version, _snapshot
+    with _lock:
+        _version += 1
+        _snapshot = None
+        if clear_refs:
+            _refs.clear()
+    collection_service.invalidate_catalog()
+
+
+def mark_dirty(db: Session, points_changed: bool = True) -> None:
+    """Species were created/changed in db's transaction; drop the snapshot once it commits."""
+    db.info[_DIRTY] = db.info.get(_DIRTY, False) or points_changed
+
+
+def species_ref(key: str) -> Optional[SpeciesRef]:
+    return _refs.get(key)
+
+
+def remember_species(db: Session, key: str, ref: SpeciesRef, committed: bool = True) -> None:
+    """Cache a resolved species; one created in db's open transaction is cached once that commits."""
+    if committed:
+        with _lock:
+            _refs[key] = ref
+    else:
+        db.info.setdefault(_PENDING_REFS, {})[key] = ref
+
+
+def warm_species_refs(db: Session) -> int:
+    """
+    Load the whole name -> id map (startup). Returns the number of species.
+    Keys are computed from common_name, so this also works before species.name_key
+    exists; of case-duplicates from the old schema the oldest row wins, like the backfill.
+    """
+    S = models.Species
+    rows = db.query(S.id, S.common_name, S.points).order_by(S.id).all()
+    with _lock:
+        for sid, name, points in rows:
+            _refs.setdefault(name_key(name), (sid, points or 0))
+    return len(rows)
+
+
+_name_keys_ready = False
+
+
+def name_keys_ready(db: Session) -> bool:
+    """True once species.name_key has its unique index (fresh schema, or after the migration)."""
+    global _name_keys_ready
+    if not _name_keys_ready:
+        indexes = inspect(db.connection()).get_indexes("species")
+        _name_keys_ready = any(ix["name"] == "ix_species_name_key" and ix["unique"] for ix in indexes)
+    return _name_keys_ready
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session):
+    if _DIRTY in session.info:
+        invalidate(clear_refs=session.info.pop(_DIRTY))
+    pending = session.info.pop(_PENDING_REFS, None)
+    if pending:
+        with _lock:
+            _refs.update(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session):
+    session.info.pop(_PENDING_REFS, None)  # those species rows no longer exist
+
+
+def get_snapshot(db: Session) -> CatalogSnapshot:
+    global _snapshot
+    now = time.time()
+    with _lock:
+        snap, version = _snapshot, _version
+    if snap is not None and snap.expires > now:
+        return snap
+
+    # shared by every reader until CATALOG_TTL: build it from the primary, not a lagging replica
+    species = sorted(db.query(models.Species).execution_options(**PRIMARY).all(), key=lambda s: s.common_name)
+    fragments = [
+        json.dumps(
+            schemas.SpeciesRead.model_validate(sp).model_dump(mode="json"),
+            ensure_ascii=False, separators=(",", ":"),
+        ).encode("utf-8")
+        for sp in species
+    ]
+    body = b"[" + b",".join(fragments) + b"]"
+    snap = CatalogSnapshot(
+        version=version,
+        fragments=fragments,
+        names=[sp.common_name.casefold() for sp in species],
+        body=body,
+        body_gzip=gzip.compress(body, 6),
+        etag=etag_of(body),
+        expires=now + CATALOG_TTL_S,
+    )
+    with _lock:
+        if version == _version:  # don't publish a snapshot that was invalidated while loading
+            _snapshot = snap
+    return snap
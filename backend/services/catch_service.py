@@ -1,22 +1,36 @@
 # backend/services/catch_service.py
 #
 # ============== CHANGES FROM ORIGINAL ==============
-# 1. Line 55-66: Use db.begin_nested() savepoints instead of db.rollback()
-#    This prevents rolling back the entire Catch when Species insert fails
-# 2. Line 75-83: Same savepoint fix for UserSpecies
+# 1. Species / UserSpecies are written with INSERT .. ON CONFLICT DO NOTHING
+#    (link_species), so a concurrent duplicate never rolls back the Catch and
+#    no savepoint or existence query is needed
+# 2. Species name -> id comes from catalog_service's cache (species.name_key)
+# 3. Functions take a sync Session (shared with background/admin code); async
+#    routes use the *_async entry point at the bottom, which run them through
+#    AsyncSession.run_sync on the async engine
 # ===================================================
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from typing import Optional
+from sqlalchemy import column, table
+from sqlalchemy.exc import SQLAlchemyError
+from typing import Dict, List, Optional, Tuple
+import asyncio
 import json
 import logging
 from datetime import datetime
 
 from backend import models
+from backend.database import dialect_insert, mark_user_wrote, writer
+from backend.geo import cell_of
+from backend.services import catalog_service, cluster_service, collection_service, leaderboard_service
+from backend.storage import remove_stored_image
 
 logger = logging.getLogger(__name__)
 
+# species without the ORM column defaults (name_key may not exist yet, see _species_ref_unmigrated)
+_species_table = table("species", column("common_name"))
+
 def create_catch(
     db: Session,
     user_id: Optional[str],
@@ -25,7 +39,10 @@ def create_catch(
     species_confidence: float,
     lat: Optional[float] = None,
     lng: Optional[float] = None,
-    weather_data: Optional[dict] = None
+    weather_data: Optional[dict] = None,
+    image_hash: Optional[str] = None,
+    derivatives: Optional[dict] = None,
+    status: str = "ready",
 ) -> models.Catch:
     """
     核心业务逻辑：创建一条捕获记录
@@ -34,64 +51,11 @@ def create_catch(
     3. 自动维护 UserSpecies 表 (点亮用户图鉴)
     """
     try:
-        # 1. 创建 Catch 记录
-        catch = models.Catch(
-            image_path=image_path,
-            species_label=species_label,
-            species_confidence=species_confidence,
-            user_id=user_id,
-            lat=lat,
-            lng=lng,
-            weather_json=json.dumps(weather_data) if weather_data else None,
-            created_at=datetime.utcnow()
+        catch = add_catch(
+            db, user_id, image_path, species_label, species_confidence,
+            lat=lat, lng=lng, weather_data=weather_data, image_hash=image_hash,
+            derivatives=derivatives, status=status,
         )
-        db.add(catch)
-        db.flush() # 获取 catch.id
-
-        # 2. 自动维护 Species 表
-        if species_label and species_label.strip() and species_label.lower() != "unknown":
-            # 先尝试查询
-            sp = db.query(models.Species).filter(
-                models.Species.common_name.ilike(species_label)
-            ).first()
-            
-            if sp is None:
-                # ============== FIX: Use savepoint ==============
-                # BEFORE: db.rollback() would rollback the ENTIRE transaction
-                #         including the Catch record we just created!
-                # AFTER:  db.begin_nested() creates a SAVEPOINT, so only
-                #         the Species insert is rolled back on conflict
-                try:
-                    with db.begin_nested():  # SAVEPOINT
-                        sp = models.Species(common_name=species_label)
-                        db.add(sp)
-                        db.flush()
-                except IntegrityError:
-                    # Another request created it first - just fetch it
-                    # The savepoint was rolled back, but our Catch is safe!
-                    sp = db.query(models.Species).filter(
-                        models.Species.common_name.ilike(species_label)
-                    ).first()
-                # ================================================
-
-            # 3. 只有已登录用户才关联 UserSpecies (点亮图鉴)
-            if user_id and sp:
-                link = db.query(models.UserSpecies).filter_by(
-                    user_id=user_id, 
-                    species_id=sp.id
-                ).first()
-                
-                if link is None:
-                    # ============== FIX: Use savepoint ==============
-                    try:
-                        with db.begin_nested():  # SAVEPOINT
-                            db.add(models.UserSpecies(user_id=user_id, species_id=sp.id))
-                            db.flush()
-                    except IntegrityError:
-                        # Link already exists from concurrent request - that's fine
-                        pass
-                    # ================================================
-
         db.commit()
         db.refresh(catch)
         return catch
@@ -100,3 +64,270 @@ def create_catch(
         db.rollback()
         logger.error(f"Error creating catch: {e}")
         raise e
+
+
+def add_catch(
+    db: Session,
+    user_id: Optional[str],
+    image_path: str,
+    species_label: str,
+    species_confidence: float,
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    weather_data: Optional[dict] = None,
+    image_hash: Optional[str] = None,
+    derivatives: Optional[dict] = None,
+    status: str = "ready",
+) -> models.Catch:
+    """create_catch() without the commit, so several catches can share one transaction."""
+    # 1. 创建 Catch 记录
+    catch = models.Catch(
+        image_path=image_path,
+        image_hash=image_hash,
+        thumb_path=(derivatives or {}).get("thumb"),
+        medium_path=(derivatives or {}).get("medium"),
+        species_label=species_label,
+        species_confidence=species_confidence,
+        user_id=user_id,
+        lat=lat,
+        lng=lng,
+        geo_cell=cell_of(lat, lng),
+        weather_json=json.dumps(weather_data) if weather_data else None,
+        status=status,
+        created_at=datetime.utcnow()
+    )
+    db.add(catch)
+    db.flush() # 获取 catch.id
+    mark_user_wrote(db, user_id)  # their next reads skip the replicas
+    cluster_service.bump(db, lat, lng, species_label, +1)
+
+    # 2. 自动维护 Species 表 + 3. 只有已登录用户才关联 UserSpecies (点亮图鉴)
+    if species_label and species_label.strip() and species_label.lower() != "unknown":
+        link_species(db, user_id, species_label)
+    return catch
+
+
+def _species_ref(db: Session, label: str) -> Optional[catalog_service.SpeciesRef]:
+    """
+    (id, points) of the species named `label` (case-insensitive), created if missing.
+    Usually a cache hit; otherwise INSERT .. ON CONFLICT DO NOTHING + one SELECT,
+    which is race-free without a savepoint.
+    """
+    key = catalog_service.name_key(label)
+    ref = catalog_service.species_ref(key)
+    if ref is not None:
+        return ref
+
+    S = models.Species
+    if not catalog_service.name_keys_ready(db):
+        return _species_ref_unmigrated(db, label, key)
+    created = db.execute(
+        dialect_insert(db)(S).values(common_name=label.strip(), name_key=key).on_conflict_do_nothing()
+    ).rowcount
+    row = db.query(S.id, S.points).filter(S.name_key == key).first()
+    if row is None:  # case-duplicate left without a key by the migration
+        row = db.query(S.id, S.points).filter(S.common_name.ilike(label.strip())).first()
+    if row is None:
+        return None
+    ref = (row.id, row.points or 0)
+    if created:
+        catalog_service.mark_dirty(db, points_changed=False)
+    catalog_service.remember_species(db, key, ref, committed=not created)
+    return ref
+
+
+def _species_ref_unmigrated(db: Session, label: str, key: str) -> Optional[catalog_service.SpeciesRef]:
+    # Before the name_key migration only common_name is unique, and case-sensitively, so
+    # ON CONFLICT would not stop "bass" next to "Bass": look up case-insensitively first
+    # and only insert when nothing matches (and without the name_key column).
+    S = models.Species
+    row = db.query(S.id, S.points).filter(S.common_name.ilike(label.strip())).order_by(S.id).first()
+    created = False
+    if row is None:
+        db.execute(dialect_insert(db)(_species_table).values(common_name=label.strip()).on_conflict_do_nothing())
+        row = db.query(S.id, S.points).filter(S.common_name.ilike(label.strip())).order_by(S.id).first()
+        created = row is not None
+        if created:
+            catalog_service.mark_dirty(db, points_changed=False)
+    if row is None:
+        return None
+    ref = (row.id, row.points or 0)
+    catalog_service.remember_species(db, key, ref, committed=not created)
+    return ref
+
+
+def link_species(db: Session, user_id: Optional[str], label: str) -> None:
+    """Make sure `label` exists in the catalog and, for a signed-in user, is in their collection."""
+    ref = _species_ref(db, label)
+    if ref is None or not user_id:
+        return
+    species_id, points = ref
+    inserted = db.execute(
+        dialect_insert(db)(models.UserSpecies)
+        .values(user_id=user_id, species_id=species_id, first_catch_at=datetime.utcnow())
+        .on_conflict_do_nothing()
+    ).rowcount
+    if inserted:  # first catch of this species: credit it exactly once
+        leaderboard_service.add_species(db, user_id, points)
+        collection_service.mark_user_dirty(db, user_id)
+
+
+def finish_catch(
+    db: Session,
+    catch_id: int,
+    image_path: Optional[str] = None,
+    derivatives: Optional[dict] = None,
+    weather_data: Optional[dict] = None,
+    status: str = "ready",
+) -> Optional[models.Catch]:
+    """
+    Patch a reserved (status="pending") catch with the results of the background
+    enrichment stage. Returns None if the catch was deleted in the meantime.
+    """
+    catch = db.query(models.Catch).filter(models.Catch.id == catch_id).first()
+    if catch is None:
+        return None
+    if image_path:
+        catch.image_path = image_path
+    if derivatives:
+        catch.thumb_path = derivatives.get("thumb")
+        catch.medium_path = derivatives.get("medium")
+    if weather_data:
+        catch.weather_json = json.dumps(weather_data)
+    catch.status = status
+    mark_user_wrote(db, catch.user_id)  # the owner is polling for status != "pending"
+    db.commit()
+    return catch
+
+
+def settle_stale_pending(db: Session, cutoff: datetime) -> Tuple[int, int]:
+    """
+    Settle catches still "pending" since before `cutoff`: their background stage
+    died with the process that reserved them (the image bytes were only in its
+    memory). Without an image -> "failed" (the client re-uploads with the same
+    idempotency key, see reopen_failed); with one -> "ready" (only weather is
+    missing). Returns (failed, ready).
+    """
+    C = models.Catch
+    stale = db.query(C).filter(C.status == "pending", C.created_at < cutoff)
+    failed = stale.filter(C.image_path == "").update({C.status: "failed"}, synchronize_session=False)
+    ready = stale.filter(C.image_path != "").update({C.status: "ready"}, synchronize_session=False)
+    db.commit()
+    return failed, ready
+
+
+def reopen_failed(db: Session, catch_id: int, image_hash: str) -> bool:
+    """
+    Back to "pending" for a failed catch (no image stored) whose photo is being
+    uploaded again, so the background stage can store it. False if the catch is
+    gone, has an image, or the upload is a different photo.
+    """
+    C = models.Catch
+    n = db.query(C).filter(
+        C.id == catch_id, C.status == "failed", C.image_path == "", C.image_hash == image_hash,
+    ).update({C.status: "pending"}, synchronize_session=False)
+    db.commit()
+    return n == 1
+
+
+# Reusing a stored blob races with deleting its last catch (see _delete_rows):
+# find_stored_image(s) read-lock the row they reuse (FOR SHARE on Postgres), so
+# that delete waits for the reserving transaction and then sees the new
+# reference; SQLite writes are serialized by writer(), and the delete re-checks
+# references after its commit before unlinking anything.
+
+def find_stored_image(db: Session, image_hash: str):
+    """(image_path, thumb_path, medium_path) of an identical image already stored for some catch, if any."""
+    return db.query(
+        models.Catch.image_path, models.Catch.thumb_path, models.Catch.medium_path
+    ).filter(
+        models.Catch.image_hash == image_hash,
+        models.Catch.image_path != "",  # still-pending reservations have no blob yet
+    ).with_for_update(read=True).first()
+
+
+def image_hash_in_use(db: Session, image_hash: str) -> bool:
+    """Any catch (including pending reservations) still referencing this image?"""
+    return db.query(models.Catch.id).filter(models.Catch.image_hash == image_hash).first() is not None
+
+
+def find_stored_images(db: Session, image_hashes: List[str]) -> Dict[str, tuple]:
+    """find_stored_image() for many hashes in one query: {hash: row with image_path, thumb_path, medium_path}."""
+    if not image_hashes:
+        return {}
+    C = models.Catch
+    rows = db.query(C.image_hash, C.image_path, C.thumb_path, C.medium_path).filter(
+        C.image_hash.in_(set(image_hashes)), C.image_path != "",
+    ).with_for_update(read=True)
+    return {r.image_hash: r for r in rows}
+
+
+def delete_catch(db: Session, catch: models.Catch) -> None:
+    """
+    删除一条捕获记录
+    Images are shared between catches with the same content hash, so the blob is
+    only removed once the last catch referencing it is gone.
+    """
+    orphan = _delete_rows(db, catch)
+    db.commit()
+
+    # Only after the commit, so a failed delete never loses the image
+    for path in _unreferenced(db, orphan):
+        _remove_image(path)
+
+
+# (image_hash, image_path, paths to remove) of a blob the deleted catch was the last user of
+Orphan = Tuple[Optional[str], str, List[str]]
+
+
+def _blob_refs(db: Session, image_hash: Optional[str], image_path: str) -> bool:
+    # rows from before content addressing have no hash; fall back to the path
+    ref = models.Catch.image_hash == image_hash if image_hash else models.Catch.image_path == image_path
+    return db.query(models.Catch.id).filter(ref).first() is not None
+
+
+def _delete_rows(db: Session, catch: models.Catch) -> Optional[Orphan]:
+    """Delete the catch (no commit). Returns its blob if no other catch references it."""
+    image_path, image_hash = catch.image_path, catch.image_hash
+    derived = [p for p in (catch.thumb_path, catch.medium_path) if p]
+    cluster_service.bump(db, catch.lat, catch.lng, catch.species_label, -1)
+    mark_user_wrote(db, catch.user_id)
+    db.delete(catch)
+    db.flush()
+
+    # Reference count: other rows still pointing at the same blob?
+    if not image_path or _blob_refs(db, image_hash, image_path):
+        return None
+    return image_hash, image_path, [image_path] + derived
+
+
+def _unreferenced(db: Session, orphan: Optional[Orphan]) -> List[str]:
+    """
+    Paths to remove, re-checked after the delete committed: a catch reserved
+    meanwhile by another transaction may have reused the blob.
+    """
+    if orphan is None:
+        return []
+    image_hash, image_path, paths = orphan
+    try:
+        return [] if _blob_refs(db, image_hash, image_path) else paths
+    finally:
+        db.rollback()  # end the read transaction
+
+
+def _remove_image(path: str) -> None:
+    try:
+        remove_stored_image(path)
+    except Exception as e:
+        logger.warning(f"Image cleanup failed for {path}: {e}")  # Don't fail delete
+
+
+# ---------- AsyncSession entry point ----------
+
+async def delete_catch_async(db: AsyncSession, catch: models.Catch) -> None:
+    """delete_catch() on an AsyncSession; blob removal (disk / Supabase) runs in a worker thread."""
+    async with writer():
+        orphan = await db.run_sync(_delete_rows, catch)
+        await db.commit()
+    for path in await db.run_sync(_unreferenced, orphan):
+        await asyncio.to_thread(_remove_image, path)
@@ -0,0 +1,130 @@
+# backend/services/cluster_service.py
+#
+# Server-side marker clustering for zoomed-out map views.
+# Instead of sending thousands of markers, the map asks for per-cell aggregates
+# (count, centroid, dominant species) at its zoom level. The aggregates live in
+# the geo_clusters table and are maintained incrementally in the same
+# transaction as the catch insert/delete, so a read is one index range scan
+# over (zoom, cell) no matter how many catches there are.
+
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from backend import geo, models
+from backend.database import dialect_insert
+
+BBox = Tuple[float, float, float, float]  # min_lat, min_lng, max_lat, max_lng
+
+
+def bump(db: Session, lat: Optional[float], lng: Optional[float], label: str, delta: int) -> None:
+    """Add (delta=1) or remove (delta=-1) one catch from every zoom level. No-op without a position."""
+    if not geo.has_position(lat, lng):
+        return
+    G = models.GeoCluster
+    label = label or "Unknown"
+    rows = [
+        {
+            "zoom": z,
+            "cell": geo.cell_of(lat, lng, geo.zoom_deg(z)),
+            "species_label": label,
+            "catch_count": delta,
+            "sum_lat": lat * delta,
+            "sum_lng": lng * delta,
+        }
+        for z in geo.CLUSTER_ZOOMS
+    ]
+    stmt = dialect_insert(db)(G).values(rows)
+    # One statement for all zoom levels; the increment is atomic in the database
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[G.zoom, G.cell, G.species_label],
+        set_={
+            "catch_count": G.catch_count + stmt.excluded.catch_count,
+            "sum_lat": G.sum_lat + stmt.excluded.sum_lat,
+            "sum_lng": G.sum_lng + stmt.excluded.sum_lng,
+        },
+    )
+    db.execute(stmt)
+    if delta < 0:
+        db.query(G).filter(
+            G.species_label == label, G.catch_count <= 0,
+            or_(*(
+                (G.zoom == z) & (G.cell == geo.cell_of(lat, lng, geo.zoom_deg(z)))
+                for z in geo.CLUSTER_ZOOMS
+            )),
+        ).delete(synchronize_session=False)
+
+
+def rebuild(db: Session, batch: int = 5000) -> int:
+    """Recompute all aggregates from the catches table (after migrating, or if they drift). Returns rows written."""
+    acc = defaultdict(lambda: [0, 0.0, 0.0])
+    C = models.Catch
+    q = db.query(C.lat, C.lng, C.species_label).filter(C.lat.isnot(None), C.lng.isnot(None))
+    for lat, lng, label in q.yield_per(batch):
+        if not geo.has_position(lat, lng):
+            continue
+        for z in geo.CLUSTER_ZOOMS:
+            a = acc[(z, geo.cell_of(lat, lng, geo.zoom_deg(z)), label or "Unknown")]
+            a[0] += 1
+            a[1] += lat
+            a[2] += lng
+
+    db.query(models.GeoCluster).delete(synchronize_session=False)
+    rows = [
+        {"zoom": z, "cell": cell, "species_label": label, "catch_count": n, "sum_lat": slat, "sum_lng": slng}
+        for (z, cell, label), (n, slat, slng) in acc.items()
+    ]
+    for i in range(0, len(rows), batch):
+        db.execute(models.GeoCluster.__table__.insert(), rows[i:i + batch])
+    return len(rows)
+
+
+def clusters(db: Session, zoom: int, bbox: BBox) -> List[dict]:
+    """Per-cell clusters intersecting bbox at the maintained zoom level closest below `zoom`."""
+    z = geo.cluster_zoom(zoom)
+    deg = geo.zoom_deg(z)
+    G = models.GeoCluster
+    ranges = geo.cell_ranges(*bbox, deg=deg)
+    rows = (
+        db.query(G.cell, G.species_label, G.catch_count, G.sum_lat, G.sum_lng)
+        .filter(G.zoom == z, or_(*(G.cell.between(lo, hi) for lo, hi in ranges)))
+        .all()
+    )
+
+    min_lat, min_lng, max_lat, max_lng = bbox
+    half = deg / 2
+
+    def _intersects(cell: int) -> bool:
+        # cell_ranges() may over-cover (whole rows); keep cells that touch the box
+        clat, clng = geo.cell_center(cell, deg)
+        if not (min_lat - half <= clat <= max_lat + half):
+            return False
+        if min_lng <= max_lng:
+            return min_lng - half <= clng <= max_lng + half
+        return clng >= min_lng - half or clng <= max_lng + half
+
+    cells = {}
+    for cell, label, n, slat, slng in rows:
+        if n <= 0 or not _intersects(cell):
+            continue
+        c = cells.setdefault(cell, {"cell": cell, "count": 0, "sum_lat": 0.0, "sum_lng": 0.0, "top": (0, None)})
+        c["count"] += n
+        c["sum_lat"] += slat
+        c["sum_lng"] += slng
+        if n > c["top"][0]:
+            c["top"] = (n, label)
+
+    return [
+        {
+            "cell": c["cell"],
+            "zoom": z,
+            "count": c["count"],
+            "lat": c["sum_lat"] / c["count"],
+            "lng": c["sum_lng"] / c["count"],
+            "top_species": c["top"][1],
+            "top_species_count": c["top"][0],
+        }
+        for c in sorted(cells.values(), key=lambda c: -c["count"])
+    ]
@@ -0,0 +1,124 @@
+# backend/services/collection_service.py
+#
+# "My collection" = the whole species catalog, each entry flagged caught/not caught.
+#
+# - cold path: one LEFT JOIN species -> user_species (for this user)
+# - the catalog part is cached per process and dropped together with the
+#   catalog_service snapshot (/species/seed, species auto-created by a catch)
+# - each user's serialized collection is cached (LRU) and dropped after a commit
+#   that added one of their UserSpecies links; the TTL bounds staleness across
+#   worker processes, whose caches are not invalidated by this one
+# - the ETag is a hash of the body, so it is stable across processes and restarts
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, event
+from sqlalchemy.orm import Session
+
+from backend import models
+
+CACHE_SIZE = int(os.getenv("COLLECTION_CACHE_SIZE", "1024"))   # users kept
+CACHE_TTL_S = float(os.getenv("COLLECTION_CACHE_TTL", "300"))
+
+_DIRTY_USERS = "collection_dirty_users"
+
+_lock = threading.Lock()
+_catalog_version = 0
+_epoch = 0  # bumped by every invalidation, so a result computed across one is not cached
+_catalog: Optional[Tuple[float, List[tuple]]] = None  # (expires, [(id, common_name, sci_name, icon_path)])
+_users: "OrderedDict[str, Tuple[int, float, bytes, str]]" = OrderedDict()  # user -> (catalog version, expires, body, etag)
+
+
+def invalidate_catalog() -> None:
+    """Called by catalog_service.invalidate()."""
+    global _catalog, _catalog_version, _epoch
+    with _lock:
+        _catalog_version += 1
+        _epoch += 1
+        _catalog = None
+        _users.clear()  # every cached body embeds the catalog
+
+
+def invalidate_user(user_id: str) -> None:
+    global _epoch
+    with _lock:
+        _epoch += 1
+        _users.pop(user_id, None)
+
+
+def mark_user_dirty(db: Session, user_id: str) -> None:
+    """A UserSpecies link for user_id was added in db's transaction; invalidate once it commits."""
+    db.info.setdefault(_DIRTY_USERS, set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session):
+    for user_id in session.info.pop(_DIRTY_USERS, ()):
+        invalidate_user(user_id)
+
+
+def _cached_catalog(now: float) -> Optional[List[tuple]]:
+    if _catalog is not None and _catalog[0] > now:
+        return _catalog[1]
+    return None
+
+
+def get_collection(db: Session, user_id: str) -> Tuple[bytes, str]:
+    """(JSON body of schemas.UserCollectionRead, ETag) for a user."""
+    global _catalog
+    now = time.time()
+    with _lock:
+        hit = _users.get(user_id)
+        if hit is not None and hit[0] == _catalog_version and hit[1] > now:
+            _users.move_to_end(user_id)
+            return hit[2], hit[3]
+        version, epoch = _catalog_version, _epoch
+        catalog = _cached_catalog(now)
+
+    S, US = models.Species, models.UserSpecies
+    if catalog is not None:
+        caught = dict(db.query(US.species_id, US.first_catch_at).filter(US.user_id == user_id))
+    else:
+        rows = (
+            db.query(S.id, S.common_name, S.sci_name, S.icon_path, US.first_catch_at)
+            .outerjoin(US, and_(US.species_id == S.id, US.user_id == user_id))
+            .order_by(S.common_name.asc())
+            .all()
+        )
+        catalog = [tuple(r[:4]) for r in rows]
+        caught = {r.id: r.first_catch_at for r in rows if r.first_catch_at is not None}
+
+    entries = [
+        {
+            "id": sid,
+            "common_name": name,
+            "sci_name": sci,
+            "icon_path": icon,
+            "caught": sid in caught,
+            "first_catch_at": caught[sid].isoformat() if sid in caught else None,
+        }
+        for sid, name, sci, icon in catalog
+    ]
+    body = json.dumps({
+        "user_id": user_id,
+        "total": len(catalog),
+        "caught": sum(1 for sid, *_ in catalog if sid in caught),
+        "species": entries,
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+    with _lock:
+        if version == _catalog_version and _catalog is None:
+            _catalog = (now + CACHE_TTL_S, catalog)
+        if epoch == _epoch:  # not invalidated while we were querying
+            _users[user_id] = (version, now + CACHE_TTL_S, body, etag)
+            _users.move_to_end(user_id)
+            while len(_users) > CACHE_SIZE:
+                _users.popitem(last=False)
+    return body, etag
@@ -0,0 +1,174 @@
+# backend/services/enrich_service.py
+#
+# Second stage of /fish/identify. The request only runs inference and reserves
+# the Catch row (status="pending"); everything slow runs here, after the
+# response has been sent:
+#   - image upload (Supabase or local fallback) + WebP derivatives
+#   - Open-Meteo weather snapshot
+# Both run concurrently, then the row is patched and marked "ready". If the
+# upload stage fails the original is saved locally instead; "failed" means no
+# image could be stored at all. Clients poll GET /catches/{id} until
+# status != "pending" (image_path is null until then).
+# The image bytes live only in this process until the upload stage stores them:
+# if it dies first, the row would stay "pending" forever. settle_stale() (at
+# startup and at most every SWEEP_INTERVAL_S from identify) settles rows pending
+# for longer than STALE_PENDING_S: "failed" without an image, so the client
+# re-uploads with the same idempotency key and the catch is reopened
+# (catch_service.reopen_failed) instead of duplicated.
+# The row patch is a short session_scope() on the async engine: no connection is
+# held while uploading or waiting for weather, and the event loop never blocks on
+# the database (e.g. SQLite waiting for a write lock).
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from backend.database import SessionLocal, session_scope
+from backend.services import catch_service
+from backend.services.weather_service import fetch_weather
+from backend.storage import remove_stored_image, save_image_local, store_derivatives, upload_image
+
+logger = logging.getLogger(__name__)
+
+STALE_PENDING_S = int(os.getenv("STALE_PENDING_S", "900"))
+SWEEP_INTERVAL_S = int(os.getenv("STALE_PENDING_SWEEP_INTERVAL_S", "300"))
+
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def _store_image(contents: bytes, content_type: str, digest: str) -> dict:
+    """Blocking: upload original + derivatives. Runs in a worker thread."""
+    try:
+        # 优先尝试云存储，失败降级到本地
+        image_url = upload_image(contents, content_type, digest)
+        if not image_url:
+            image_url = save_image_local(contents, content_type, digest)
+    except Exception as e:
+        logger.error(f"Upload failed: {e}")
+        image_url = save_image_local(contents, content_type, digest)
+
+    try:
+        derivatives = store_derivatives(contents, digest)
+    except Exception as e:
+        logger.warning(f"Derivative generation failed: {e}")
+        derivatives = {}
+    return {"image_path": image_url, "derivatives": derivatives}
+
+
+async def _none():
+    return None
+
+
+async def enrich_catch(
+    catch_id: int,
+    contents: Optional[bytes],
+    content_type: str,
+    digest: str,
+    lat: Optional[float],
+    lng: Optional[float],
+) -> None:
+    """Background task: store the image (if `contents` is given) and fetch weather, then patch the row."""
+    await enrich_catches([{
+        "catch_id": catch_id, "contents": contents, "content_type": content_type,
+        "digest": digest, "lat": lat, "lng": lng,
+    }])
+
+
+async def enrich_catches(jobs: List[dict]) -> None:
+    """
+    Background task for several catches (batch ingest): every distinct image is
+    stored once, and all uploads and weather lookups run concurrently.
+    Each job: catch_id, contents (None = already stored), content_type, digest, lat, lng.
+    """
+    uploads = {}
+    for job in jobs:
+        if job["contents"] is not None and job["digest"] not in uploads:
+            uploads[job["digest"]] = asyncio.ensure_future(
+                asyncio.to_thread(_store_image, job["contents"], job["content_type"], job["digest"])
+            )
+    await asyncio.gather(*(
+        _finish(job, uploads.get(job["digest"]) if job["contents"] is not None else None)
+        for job in jobs
+    ))
+
+
+async def _stored(upload: asyncio.Future, job: dict) -> dict:
+    """The upload's result; if that stage failed, the original is saved locally so the catch still gets an image."""
+    try:
+        return await upload
+    except Exception as e:
+        logger.error(f"Image storage failed for catch {job['catch_id']}: {e}; saving locally")
+    image_path = await asyncio.to_thread(save_image_local, job["contents"], job["content_type"], job["digest"])
+    return {"image_path": image_path, "derivatives": {}}
+
+
+async def _finish(job: dict, upload: Optional[asyncio.Future]) -> None:
+    catch_id, digest, lat, lng = job["catch_id"], job["digest"], job["lat"], job["lng"]
+    stored, weather = await asyncio.gather(
+        _stored(upload, job) if upload is not None else _none(),
+        fetch_weather(lat, lng) if lat is not None and lng is not None else _none(),
+        return_exceptions=True,
+    )
+    if isinstance(stored, Exception):
+        logger.error(f"Could not store the image of catch {catch_id}: {stored}")
+        stored = None
+    if isinstance(weather, Exception):
+        logger.warning(f"Weather failed for catch {catch_id}: {weather}")
+        weather = None
+    # failed = no image could be stored at all (the row keeps image_path "", served as null)
+    status = "failed" if upload is not None and stored is None else "ready"
+
+    def patch(db) -> bool:
+        """Patch the row; True if it was deleted meanwhile and nothing else uses the image."""
+        catch = catch_service.finish_catch(
+            db,
+            catch_id,
+            image_path=stored["image_path"] if stored else None,
+            derivatives=stored["derivatives"] if stored else None,
+            weather_data=weather,
+            status=status,
+        )
+        # Deleted while we were uploading: drop the blobs unless another catch
+        # (stored or still pending, e.g. from the same batch) uses them
+        return catch is None and bool(stored) and not catch_service.image_hash_in_use(db, digest)
+
+    try:
+        async with session_scope(write=True) as db:
+            orphaned = await db.run_sync(patch)
+        if orphaned:
+            for path in [stored["image_path"], *stored["derivatives"].values()]:
+                await asyncio.to_thread(remove_stored_image, path)
+    except Exception as e:
+        logger.error(f"Could not finish catch {catch_id}: {e}")
+
+
+def settle_stale() -> None:
+    """Settle catches pending for longer than STALE_PENDING_S (own session; startup / background task)."""
+    db = SessionLocal()
+    try:
+        failed, ready = catch_service.settle_stale_pending(
+            db, datetime.utcnow() - timedelta(seconds=STALE_PENDING_S)
+        )
+        if failed or ready:
+            logger.warning(f"Settled stale pending catches: {failed} failed (no image), {ready} ready")
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Stale pending sweep failed: {e}")
+    finally:
+        db.close()
+
+
+def sweep_due() -> bool:
+    """True at most once per SWEEP_INTERVAL_S (per process); the caller then runs settle_stale in the background."""
+    global _last_sweep
+    with _sweep_lock:
+        now = time.monotonic()
+        if now - _last_sweep < SWEEP_INTERVAL_S:
+            return False
+        _last_sweep = now
+        return True
@@ -0,0 +1,122 @@
+# backend/services/idempotency_service.py
+#
+# Client-supplied idempotency keys for catch ingestion. The mobile app syncs
+# offline catches and retries after timeouts; with a key (its local_id) the
+# retry gets the result of the first attempt back (refreshed with the catch's
+# current status / image / weather) instead of a second Catch row. Records are
+# written in the same transaction as the catch, so a key is never stored
+# without its catch (or vice versa).
+# Records expire after IDEMPOTENCY_TTL_S (longer than any client retry window);
+# expired ones are ignored by lookup() and deleted by purge_expired(), which
+# identify schedules at most every PURGE_INTERVAL_S.
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LEN = 128
+TTL_S = int(os.getenv("IDEMPOTENCY_TTL_S", str(48 * 3600)))
+PURGE_INTERVAL_S = int(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_S", "600"))
+
+_purge_lock = threading.Lock()
+_last_purge = 0.0
+
+
+def _cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=TTL_S)
+
+
+def normalize_key(key: Optional[str]) -> Optional[str]:
+    key = (key or "").strip()
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LEN:
+        raise ValueError(f"Idempotency key longer than {MAX_KEY_LEN} characters")
+    return key
+
+
+def lookup(db: Session, user_id: str, keys: Iterable[str]) -> Dict[str, dict]:
+    """
+    Stored responses for the keys this user already used: {key: response}.
+    The response was recorded when the catch was reserved (status "pending",
+    saved_path/weather null), so the fields the background stage fills in are
+    refreshed from the catch's current row; a deleted catch keeps the original.
+    """
+    keys = {k for k in keys if k}
+    if not keys:
+        return {}
+    R, C = models.IdempotencyRecord, models.Catch
+    rows = db.query(
+        R.key, R.response_json, C.id, C.image_path, C.thumb_path, C.medium_path, C.status, C.weather_json,
+    ).outerjoin(C, C.id == R.catch_id).filter(
+        R.user_id == user_id, R.key.in_(keys), R.created_at >= _cutoff(),
+    )
+    out = {}
+    for row in rows:
+        response = json.loads(row.response_json)
+        if row.id is not None:
+            response.update(
+                saved_path=row.image_path or None,
+                thumb_path=row.thumb_path,
+                medium_path=row.medium_path,
+                status=row.status,
+                weather=json.loads(row.weather_json) if row.weather_json else None,
+            )
+        out[row.key] = response
+    return out
+
+
+def record(db: Session, user_id: str, key: str, catch_id: Optional[int], response: dict) -> None:
+    """Store the response for key (no commit; a concurrent duplicate fails the commit with IntegrityError)."""
+    R = models.IdempotencyRecord
+    # an expired record not purged yet would still hold the unique (user_id, key)
+    db.query(R).filter(R.user_id == user_id, R.key == key, R.created_at < _cutoff()).delete(synchronize_session=False)
+    db.add(models.IdempotencyRecord(
+        user_id=user_id,
+        key=key,
+        catch_id=catch_id,
+        response_json=json.dumps(response),
+    ))
+
+
+def purge_expired(db: Session) -> int:
+    """Delete expired records. Returns the number deleted."""
+    R = models.IdempotencyRecord
+    n = db.query(R).filter(R.created_at < _cutoff()).delete(synchronize_session=False)
+    db.commit()
+    return n
+
+
+def purge_due() -> bool:
+    """True at most once per PURGE_INTERVAL_S (per process); the caller then runs purge_in_background."""
+    global _last_purge
+    with _purge_lock:
+        now = time.monotonic()
+        if now - _last_purge < PURGE_INTERVAL_S:
+            return False
+        _last_purge = now
+        return True
+
+
+def purge_in_background() -> None:
+    """Background task with its own session."""
+    db = SessionLocal()
+    try:
+        n = purge_expired(db)
+        if n:
+            logger.info(f"Purged {n} expired idempotency records")
+    except Exception as e:
+        logger.warning(f"Idempotency purge failed: {e}")
+    finally:
+        db.close()
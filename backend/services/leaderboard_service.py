@@ -0,0 +1,97 @@
+# backend/services/leaderboard_service.py
+#
+# Leaderboard backed by the user_scores table instead of aggregating the whole
+# user_species table per request. Ranking: unique species desc, then points
+# desc, then user_id (stable ties). Scores are bumped in the same transaction
+# that creates the UserSpecies link, so they never drift from the collection;
+# if Species.points are re-seeded, run rebuild() to re-weight existing links.
+# An existing database gets its scores from backfill_if_empty() at startup.
+
+from typing import List, Optional
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.database import dialect_insert
+
+
+def add_species(db: Session, user_id: str, points: int) -> None:
+    """Credit a newly created UserSpecies link worth `points`. Call only after the link insert succeeded."""
+    S = models.UserScore
+    stmt = dialect_insert(db)(S).values(user_id=user_id, species_count=1, points=points)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[S.user_id],
+        set_={
+            "species_count": S.species_count + 1,
+            "points": S.points + stmt.excluded.points,
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(stmt)
+
+
+def rebuild(db: Session) -> int:
+    """Recompute every score from user_species + species. Returns the number of users."""
+    rows = (
+        db.query(
+            models.UserSpecies.user_id,
+            func.count(models.UserSpecies.species_id),
+            func.coalesce(func.sum(models.Species.points), 0),
+        )
+        .join(models.Species, models.Species.id == models.UserSpecies.species_id)
+        .group_by(models.UserSpecies.user_id)
+        .all()
+    )
+    db.query(models.UserScore).delete(synchronize_session=False)
+    if rows:
+        db.execute(models.UserScore.__table__.insert(), [
+            {"user_id": uid, "species_count": int(n), "points": int(pts)} for uid, n, pts in rows
+        ])
+    return len(rows)
+
+
+def backfill_if_empty(db: Session) -> int:
+    """
+    rebuild() when user_scores is empty but collections exist (a database from before
+    this table: create_all() makes it empty). Returns the number of users, 0 if skipped.
+    """
+    if db.query(models.UserScore.user_id).first() is not None:
+        return 0
+    if db.query(models.UserSpecies.user_id).first() is None:
+        return 0
+    return rebuild(db)
+
+
+def top(db: Session, limit: int) -> List[models.UserScore]:
+    S = models.UserScore
+    return (
+        db.query(S)
+        .order_by(S.species_count.desc(), S.points.desc(), S.user_id)
+        .limit(limit)
+        .all()
+    )
+
+
+def rank(db: Session, user_id: str) -> Optional[dict]:
+    """
+    1-based rank of a user (None if they have no species yet): number of users strictly ahead + 1.
+    The COUNT walks the (species_count, points, user_id) index up to the user's position,
+    so it is O(log n + rank), not O(log n): cheap near the top, a scan of most of the
+    index for users near the bottom of a large board.
+    """
+    S = models.UserScore
+    me = db.query(S).filter(S.user_id == user_id).first()
+    if me is None:
+        return None
+    ahead = db.query(func.count()).select_from(S).filter(or_(
+        S.species_count > me.species_count,
+        and_(S.species_count == me.species_count, S.points > me.points),
+        and_(S.species_count == me.species_count, S.points == me.points, S.user_id < me.user_id),
+    )).scalar()
+    return {
+        "user_id": me.user_id,
+        "rank": int(ahead) + 1,
+        "uniq_species_count": me.species_count,
+        "points": me.points,
+    }
@@ -0,0 +1,118 @@
+# backend/services/species_service.py
+#
+# Bulk species seeding. The old /seed did one ILIKE lookup + one flush per
+# entry (2N round trips); here it is one SELECT of the existing rows, a diff in
+# Python, and one INSERT .. ON CONFLICT (common_name) DO UPDATE per column set
+# for the rows that actually changed.
+#
+# Sources:
+#   builtin - FULL_FISH_DATA in routers/species.py (rich fields: rarity, points ...)
+#   csv     - ml/data/species_ma.csv (the classifier's taxonomy; enabled rows only)
+#   json    - fishing-mobile/assets/species/species_na.json (the app's bundled list)
+# Earlier sources win: a later source only fills fields that are still missing,
+# so builtin,csv keeps the curated habitat text and takes the CSV's scientific
+# names. Seeding catalogs alone (fill_only) never overwrites a stored value.
+
+import csv
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.database import dialect_insert
+from backend.services import catalog_service
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+SPECIES_CSV = Path(os.getenv("SPECIES_CSV", REPO_ROOT / "ml" / "data" / "species_ma.csv"))
+SPECIES_JSON = Path(os.getenv("SPECIES_JSON", REPO_ROOT / "fishing-mobile" / "assets" / "species" / "species_na.json"))
+
+SOURCES = ("builtin", "csv", "json")
+
+
+def load_csv(path: Path = SPECIES_CSV) -> List[dict]:
+    out = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if (row.get("enabled") or "true").strip().lower() not in ("true", "1", "yes"):
+                continue
+            entry = {"common_name": row["common_name"].strip()}
+            if (row.get("scientific_name") or "").strip():
+                entry["sci_name"] = row["scientific_name"].strip()
+            if (row.get("habitat") or "").strip():
+                entry["habitat"] = row["habitat"].strip()
+            out.append(entry)
+    return out
+
+
+def load_json(path: Path = SPECIES_JSON) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        items = json.load(f)
+    out = []
+    for item in items:
+        entry = {"common_name": item["common"].strip()}
+        if item.get("scientific"):
+            entry["sci_name"] = item["scientific"].strip()
+        out.append(entry)
+    return out
+
+
+def merge(*sources: Iterable[dict]) -> List[dict]:
+    """Entries by case-insensitive name; later sources only fill fields the earlier ones left missing/None."""
+    merged: "OrderedDict[str, dict]" = OrderedDict()
+    for entries in sources:
+        for e in entries:
+            if not e.get("common_name"):
+                continue
+            cur = merged.setdefault(e["common_name"].lower(), {})
+            for k, v in e.items():
+                if cur.get(k) is None:
+                    cur[k] = v
+    return list(merged.values())
+
+
+def bulk_upsert(db: Session, entries: List[dict], fill_only: bool = False) -> Dict[str, List[str]]:
+    """
+    Insert missing species and update changed fields of existing ones
+    (fill_only: only fields that are NULL in the database).
+    Returns {"created": [...], "updated": [...], "unchanged": [...]} (common names).
+    Does not commit.
+    """
+    S = models.Species
+    existing = {sp.common_name.lower(): sp for sp in db.query(S).all()}
+
+    diff = {"created": [], "updated": [], "unchanged": []}
+    groups: Dict[tuple, List[dict]] = {}  # one statement per column set (multi-row VALUES need the same keys)
+    for e in merge(entries):
+        row = dict(e, name_key=catalog_service.name_key(e["common_name"]))
+        cur = existing.get(row["common_name"].lower())
+        if cur is None:
+            diff["created"].append(row["common_name"])
+        else:
+            row["common_name"] = cur.common_name  # keep the stored spelling so ON CONFLICT matches
+            row["name_key"] = catalog_service.name_key(cur.common_name)
+            if fill_only:
+                row = {k: v for k, v in row.items() if k in ("common_name", "name_key") or getattr(cur, k) is None}
+            if all(getattr(cur, k) == v for k, v in row.items()):
+                diff["unchanged"].append(row["common_name"])
+                continue
+            diff["updated"].append(row["common_name"])
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    insert = dialect_insert(db)
+    for keys, rows in groups.items():
+        stmt = insert(S).values(rows)
+        update = {k: stmt.excluded[k] for k in keys if k != "common_name"}
+        if update:
+            stmt = stmt.on_conflict_do_update(index_elements=[S.common_name], set_=update)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[S.common_name])
+        db.execute(stmt)
+
+    if diff["created"] or diff["updated"]:
+        db.expire_all()  # loaded Species objects are stale now
+        catalog_service.mark_dirty(db)
+    return diff
@@ -0,0 +1,130 @@
+# backend/services/upload_service.py
+#
+# Image upload intake for /fish/identify, /fish/identify-batch and /predict.
+#
+# - UploadLimitMiddleware rejects oversized request bodies before they are
+#   parsed: a too-large Content-Length gets 413 immediately, and a body that
+#   streams past the limit (chunked / lying header) is cut off at the limit
+#   instead of being spooled to disk in full.
+# - read_image_upload() reads the part in chunks, stops at MAX_BYTES, sniffs the
+#   real format from the magic bytes (the client's Content-Type is not trusted)
+#   and hashes while reading, so the bytes are walked once and the digest is
+#   ready for the prediction cache and blob dedup.
+
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from fastapi import HTTPException, UploadFile
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+MAX_BYTES = 6 * 1024 * 1024  # 6 MB per image
+CHUNK_SIZE = 64 * 1024
+FORM_OVERHEAD = 64 * 1024    # multipart boundaries + small form fields
+BATCH_MAX_ITEMS = int(os.getenv("IDENTIFY_BATCH_MAX", "16"))
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Content type from the file signature, or None if it is not a supported image."""
+    if head[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if head[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+@dataclass
+class ImageUpload:
+    data: bytes
+    content_type: str          # sniffed, not client-declared
+    sha256: str                # blob name / prediction cache key
+    sha1: Optional[str] = None  # only when asked for (/predict's image_sha1)
+    filename: Optional[str] = None
+
+
+async def read_image_upload(file: UploadFile, max_bytes: int = MAX_BYTES, want_sha1: bool = False) -> ImageUpload:
+    """
+    Read an uploaded image in CHUNK_SIZE pieces, hashing as we go.
+    Raises 415 as soon as the first chunk isn't JPEG/PNG/WebP, 413 as soon as
+    the size passes max_bytes (the rest is never read), 400 if empty.
+    """
+    sha256 = hashlib.sha256()
+    sha1 = hashlib.sha1() if want_sha1 else None
+    chunks = []
+    size = 0
+    content_type = None
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if content_type is None:
+            content_type = sniff_image_type(chunk)
+            if content_type is None:
+                raise HTTPException(415, detail=f"Unsupported type: {file.content_type} (expected JPEG, PNG or WebP)")
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(413, detail=f"File too large (>{max_bytes // (1024 * 1024)}MB)")
+        sha256.update(chunk)
+        if sha1 is not None:
+            sha1.update(chunk)
+        chunks.append(chunk)
+
+    if size == 0:
+        raise HTTPException(400, detail="Empty file")
+    return ImageUpload(
+        data=b"".join(chunks),
+        content_type=content_type,
+        sha256=sha256.hexdigest(),
+        sha1=sha1.hexdigest() if sha1 is not None else None,
+        filename=file.filename,
+    )
+
+
+# ---------- Request body limit ----------
+# Whole-request limits for the upload endpoints (path -> bytes)
+BODY_LIMITS: Dict[str, int] = {
+    "/fish/identify": MAX_BYTES + FORM_OVERHEAD,
+    "/fish/identify-protected": MAX_BYTES + FORM_OVERHEAD,
+    "/fish/identify-batch": BATCH_MAX_ITEMS * (MAX_BYTES + FORM_OVERHEAD),
+    "/predict": MAX_BYTES + FORM_OVERHEAD,
+}
+
+
+class UploadLimitMiddleware:
+    """Pure ASGI (no body buffering): fail uploads that exceed BODY_LIMITS early."""
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, int] = BODY_LIMITS):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limit = self.limits.get(scope.get("path", "").rstrip("/")) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            return await self._reject(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # surfaces from request.form(); FastAPI re-raises HTTPExceptions -> 413
+                    raise HTTPException(413, detail="Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send):
+        from starlette.responses import JSONResponse
+        response = JSONResponse({"detail": "Request body too large"}, status_code=413, headers={"Connection": "close"})
+        await response(scope, receive, send)
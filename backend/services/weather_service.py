@@ -0,0 +1,111 @@
+# backend/services/weather_service.py
+# Open-Meteo current-conditions snapshot attached to catches
+#
+# - one pooled httpx.AsyncClient for the app lifetime (keep-alive, no TLS handshake per call)
+# - results cached per grid cell (WEATHER_GRID_DEG) and time bucket (WEATHER_BUCKET_S):
+#   catches a few hundred metres apart within the same hour share one snapshot
+# - concurrent requests for the same cell/bucket share a single upstream call
+
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import asyncio
+import logging
+import math
+import os
+import time
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Point this at a local stand-in to develop/test without hitting Open-Meteo
+OPEN_METEO_URL = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+GRID_DEG = float(os.getenv("WEATHER_GRID_DEG", "0.1"))     # ~11 km cells
+BUCKET_S = int(os.getenv("WEATHER_BUCKET_S", "3600"))      # one snapshot per cell per hour
+CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "4096"))
+CURRENT_FIELDS = "temperature_2m,relative_humidity_2m,wind_speed_10m,wind_direction_10m,weather_code"
+
+CellKey = Tuple[int, int, int]
+
+_client: Optional[httpx.AsyncClient] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_cache: "OrderedDict[CellKey, dict]" = OrderedDict()
+_inflight: Dict[CellKey, asyncio.Future] = {}
+
+
+async def _get_client() -> httpx.AsyncClient:
+    """App-lifetime pooled client (rebuilt if the event loop changed, e.g. in tests)."""
+    global _client, _loop
+    loop = asyncio.get_running_loop()
+    if _client is not None and _loop is not loop:
+        old, _client = _client, None
+        try:
+            await old.aclose()  # release its pool; connections tied to a closed loop may fail to close
+        except Exception as e:
+            logger.debug("Closing stale weather client failed: %s", e)
+    if _client is None:  # (re-checked after the await: a concurrent caller may have built it)
+        _client = httpx.AsyncClient(
+            timeout=8,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+        _loop = loop
+        _inflight.clear()  # futures belong to the old loop
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _cell(lat: float, lng: float) -> CellKey:
+    return (
+        math.floor(lat / GRID_DEG),
+        math.floor(lng / GRID_DEG),
+        int(time.time() // BUCKET_S),
+    )
+
+
+async def _fetch(lat: float, lng: float) -> Optional[dict]:
+    try:
+        r = await (await _get_client()).get(OPEN_METEO_URL, params={
+            "latitude": round(lat, 4),
+            "longitude": round(lng, 4),
+            "current": CURRENT_FIELDS,
+        })
+        if r.status_code == 200:
+            return r.json()
+    except Exception as e:
+        logger.warning("Weather fetch failed: %s", e)
+    return None
+
+
+async def fetch_weather(lat: float, lng: float) -> Optional[dict]:
+    """Minimal current-conditions snapshot via Open-Meteo (cached per grid cell and hour)."""
+    key = _cell(lat, lng)
+    hit = _cache.get(key)
+    if hit is not None:
+        _cache.move_to_end(key)
+        return hit
+
+    await _get_client()  # resets _inflight if we're on a new loop
+    pending = _inflight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)  # someone is already asking for this cell
+
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[key] = fut
+    try:
+        # query the cell centre, so the cached snapshot is equally valid for the whole cell
+        data = await _fetch((key[0] + 0.5) * GRID_DEG, (key[1] + 0.5) * GRID_DEG)
+        if data is not None:  # failures are not cached; the next catch retries
+            _cache[key] = data
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+        fut.set_result(data)
+        return data
+    finally:
+        if not fut.done():
+            fut.set_result(None)  # cancelled: don't leave waiters hanging
+        _inflight.pop(key, None)
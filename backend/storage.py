@@ -1,11 +1,18 @@
 """
 Supabase Storage helper for fish photo uploads.
 Replaces local file storage with Supabase cloud storage.
+
+Blobs are content-addressed: the object name is the sha256 of the bytes,
+so identical photos map to one object and are only stored once.
 """
+import hashlib
 import os
-import uuid
-from typing import Optional
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional
 from dotenv import load_dotenv
+from PIL import Image, ImageOps
 
 load_dotenv()
 
@@ -14,6 +21,17 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
 BUCKET_NAME = "fish_photos"
 
+# Local storage fallback
+SAVE_DIR = os.path.join("assets", "uploads")
+UPLOADS_DIR = Path(SAVE_DIR).resolve()
+EXT_FOR = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"}
+os.makedirs(SAVE_DIR, exist_ok=True)
+
+# Small WebP derivatives for feed cards / map markers, so clients don't fetch the original
+DERIVATIVE_SIZES = {"thumb": 128, "medium": 512}  # longest side in px
+DERIVED_DIR = os.path.join("assets", "derived")
+DERIVED_ROOT = Path(DERIVED_DIR).resolve()
+
 # Lazy-loaded Supabase client
 _supabase = None
 
@@ -29,9 +47,19 @@ def get_supabase():
     return _supabase
 
 
-def upload_image(image_bytes: bytes, content_type: str) -> Optional[str]:
+def content_hash(image_bytes: bytes) -> str:
+    """sha256 hex digest used as the blob name"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def blob_name(digest: str, content_type: str) -> str:
+    """<2-char shard>/<digest>.<ext>, e.g. 3f/3fa9...c1.jpg"""
+    return f"{digest[:2]}/{digest}.{EXT_FOR.get(content_type, 'jpg')}"
+
+
+def upload_image(image_bytes: bytes, content_type: str, digest: Optional[str] = None) -> Optional[str]:
     """
-    Upload image to Supabase Storage.
+    Upload image to Supabase Storage under its content hash.
     
     Returns:
         Public URL of uploaded image, or None if Supabase not configured
@@ -40,19 +68,14 @@ def upload_image(image_bytes: bytes, content_type: str) -> Optional[str]:
     if not supabase:
         return None  # Signal to use local storage fallback
     
-    # Determine file extension
-    ext_map = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"}
-    ext = ext_map.get(content_type, "jpg")
-    
-    # Generate unique filename
-    filename = f"{uuid.uuid4().hex}.{ext}"
-    file_path = f"catches/{filename}"
+    file_path = f"catches/{blob_name(digest or content_hash(image_bytes), content_type)}"
     
     # Upload to Supabase Storage
+    # upsert: the name is the content hash, so overwriting an existing object is a no-op
     supabase.storage.from_(BUCKET_NAME).upload(
         path=file_path,
         file=image_bytes,
-        file_options={"content-type": content_type}
+        file_options={"content-type": content_type, "upsert": "true"}
     )
     
     # Get public URL
@@ -60,6 +83,50 @@ def upload_image(image_bytes: bytes, content_type: str) -> Optional[str]:
     return public_url
 
 
+def make_derivatives(image_bytes: bytes) -> Dict[str, bytes]:
+    """Encode one WebP per DERIVATIVE_SIZES entry (aspect kept) from a single decode."""
+    img = Image.open(BytesIO(image_bytes))
+    largest = max(DERIVATIVE_SIZES.values())
+    if img.format == "JPEG":
+        img.draft("RGB", (largest, largest))  # scale on decode, see ml.predict.decode_image
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    out = {}
+    for name, side in sorted(DERIVATIVE_SIZES.items(), key=lambda kv: -kv[1]):
+        img.thumbnail((side, side), reducing_gap=3.0)  # largest first, each step shrinks further
+        buf = BytesIO()
+        img.save(buf, "WEBP", quality=80, method=4)
+        out[name] = buf.getvalue()
+    return out
+
+
+def store_derivatives(image_bytes: bytes, digest: str) -> Dict[str, str]:
+    """
+    Create and store derivatives for an image, content-addressed like the original.
+    Returns {"thumb": url, "medium": url}. Local blobs that already exist are not re-encoded.
+    """
+    names = {k: f"{side}/{digest[:2]}/{digest}.webp" for k, side in DERIVATIVE_SIZES.items()}
+    supabase = get_supabase()
+    if not supabase and all(os.path.exists(os.path.join(DERIVED_DIR, n)) for n in names.values()):
+        return {k: f"/assets/derived/{n}" for k, n in names.items()}
+
+    urls = {}
+    for key, data in make_derivatives(image_bytes).items():
+        name = names[key]
+        if supabase:
+            path = f"derived/{name}"
+            supabase.storage.from_(BUCKET_NAME).upload(
+                path=path,
+                file=data,
+                file_options={"content-type": "image/webp", "upsert": "true"}
+            )
+            urls[key] = supabase.storage.from_(BUCKET_NAME).get_public_url(path)
+        else:
+            abs_path = os.path.join(DERIVED_DIR, name)
+            _write_atomic(abs_path, data)
+            urls[key] = f"/assets/derived/{name}"
+    return urls
+
+
 def delete_image(image_url: str) -> bool:
     """
     Delete image from Supabase Storage.
@@ -87,6 +154,40 @@ def delete_image(image_url: str) -> bool:
     return False
 
 
+def save_image_local(image_bytes: bytes, content_type: str, digest: Optional[str] = None) -> str:
+    """Fallback: save image to local disk, skipping the write if the blob already exists"""
+    name = blob_name(digest or content_hash(image_bytes), content_type)
+    abs_path = os.path.join(SAVE_DIR, name)
+    if not os.path.exists(abs_path):
+        _write_atomic(abs_path, image_bytes)
+    return f"/assets/uploads/{name}"
+
+
+def _write_atomic(abs_path: str, data: bytes):
+    # unique tmp per writer + rename: concurrent writers of the same blob (threads
+    # or processes) can't truncate each other's file or publish a partial one
+    directory = os.path.dirname(abs_path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as f:
+        f.write(data)
+    try:
+        os.replace(f.name, abs_path)
+    except OSError:
+        os.unlink(f.name)
+        raise
+
+
+def remove_stored_image(image_path: str) -> bool:
+    """Delete a blob from Supabase or local assets (only inside UPLOADS_DIR / DERIVED_DIR)."""
+    if is_supabase_url(image_path):
+        return delete_image(image_path)
+    candidate = Path(image_path.lstrip("/")).resolve()
+    if candidate.is_file() and (UPLOADS_DIR in candidate.parents or DERIVED_ROOT in candidate.parents):
+        candidate.unlink(missing_ok=True)
+        return True
+    return False
+
+
 def is_supabase_url(path: str) -> bool:
     """Check if path is a Supabase Storage URL vs local path"""
     return path.startswith("http") if path else False
@@ -0,0 +1,68 @@
+# backend/tests/conftest.py
+# Run from the repo root: python -m pytest backend/tests
+#
+# The app is configured at import time (engine, upload dirs, JWT secret), so the
+# environment is set up here before anything from backend is imported: a
+# throwaway working directory (SQLite fallback ./data/app.db, local ./assets)
+# and no Supabase / Postgres / replicas / real weather API. Inference uses the
+# mock model (no weights in the repo).
+
+import asyncio
+import io
+import os
+import tempfile
+import time
+
+import httpx
+import jwt
+import pytest
+from PIL import Image
+
+_WORKDIR = tempfile.mkdtemp(prefix="only_fishing_tests_")
+os.chdir(_WORKDIR)
+for _var in ("DATABASE_URL", "ASYNC_DATABASE_URL", "DATABASE_REPLICA_URLS",
+             "SUPABASE_URL", "SUPABASE_ANON_KEY", "PRED_CACHE_DIR"):
+    os.environ.pop(_var, None)
+JWT_SECRET = "test-secret-0123456789abcdef0123456789abcdef"
+os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+os.environ["OPEN_METEO_URL"] = "http://weather.invalid/v1/forecast"
+
+
+def bearer(user_id: str = "user-1") -> dict:
+    token = jwt.encode(
+        {"sub": user_id, "email": f"{user_id}@example.com", "role": "authenticated", "exp": int(time.time()) + 3600},
+        JWT_SECRET, algorithm="HS256",
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def jpeg(color=(10, 20, 30), size=(64, 48)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def fresh_db():
+    """Empty tables and species caches."""
+    from backend import models
+    from backend.database import engine
+    from backend.services import catalog_service
+
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    catalog_service.invalidate()
+    yield
+
+
+@pytest.fixture
+def api(fresh_db):
+    """api(fn): run `await fn(client)` against the app in-process (background tasks included)."""
+    from backend.main import app
+
+    def run(fn):
+        async def go():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                return await fn(client)
+        return asyncio.run(go())
+    return run
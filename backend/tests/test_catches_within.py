@@ -0,0 +1,50 @@
+# backend/tests/test_catches_within.py
+# GET /catches/within: bbox and radius modes.
+
+from backend.database import SessionLocal
+from backend.geo import radius_bbox
+from backend.services import catch_service
+
+CENTRE = (42.36, -71.06)
+RADIUS_KM = 10.0
+
+
+def add_catches(points):
+    """Insert catches in order (later = newer id). Returns their ids."""
+    db = SessionLocal()
+    try:
+        return [catch_service.create_catch(db, "user-1", "/assets/uploads/x.jpg", "Bass", 0.9, lat=la, lng=ln).id
+                for la, ln in points]
+    finally:
+        db.close()
+
+
+def corners():
+    # just inside the bounding box of the circle, but ~14 km from the centre
+    min_lat, min_lng, max_lat, max_lng = radius_bbox(*CENTRE, RADIUS_KM)
+    pad = 0.001
+    return [(max_lat - pad, max_lng - pad), (max_lat - pad, min_lng + pad),
+            (min_lat + pad, max_lng - pad), (min_lat + pad, min_lng + pad)]
+
+
+def within(client, **params):
+    return client.get("/catches/within", params=params)
+
+
+def test_radius_is_applied_before_the_limit(api):
+    inside = add_catches([(CENTRE[0] + 0.01 * i, CENTRE[1]) for i in range(3)])
+    add_catches(corners() * 2)  # 8 newer catches in the box's corners, outside the circle
+
+    r = api(lambda c: within(c, lat=CENTRE[0], lng=CENTRE[1], radius_km=RADIUS_KM, limit=2))
+    assert r.status_code == 200
+    assert [m["id"] for m in r.json()] == [inside[2], inside[1]]
+
+    r = api(lambda c: within(c, lat=CENTRE[0], lng=CENTRE[1], radius_km=RADIUS_KM, limit=50))
+    assert [m["id"] for m in r.json()] == inside[::-1]
+
+
+def test_bbox_includes_the_corners(api):
+    ids = add_catches([CENTRE] + corners())
+    min_lat, min_lng, max_lat, max_lng = radius_bbox(*CENTRE, RADIUS_KM)
+    r = api(lambda c: within(c, bbox=f"{min_lng},{min_lat},{max_lng},{max_lat}", limit=3))
+    assert [m["id"] for m in r.json()] == ids[::-1][:3]
@@ -0,0 +1,27 @@
+# backend/tests/test_database.py
+# writer(): the SQLite write lock works from more than one event loop.
+
+import asyncio
+
+from backend import database
+
+
+def test_writer_lock_follows_the_running_loop(monkeypatch):
+    monkeypatch.setattr(database, "IS_SQLITE", True)
+    monkeypatch.setattr(database, "SQLITE_TUNED", True)
+
+    async def contend():
+        order = []
+
+        async def write(name):
+            async with database.writer():
+                order.append(f"{name} in")
+                await asyncio.sleep(0.01)
+                order.append(f"{name} out")
+
+        await asyncio.gather(write("a"), write("b"))
+        return order
+
+    # e.g. a test client per asyncio.run(), or a worker restarting its loop
+    for _ in range(2):
+        assert asyncio.run(contend()) == ["a in", "a out", "b in", "b out"]
@@ -0,0 +1,132 @@
+# backend/tests/test_identify_batch.py
+# POST /fish/identify-batch: idempotency keys, per-item errors, one transaction.
+
+import json
+
+import pytest
+from sqlalchemy import event
+
+from backend import models
+from backend.database import SessionLocal, async_engine
+from backend.services import enrich_service, idempotency_service
+from backend.services.upload_service import MAX_BYTES
+from backend.tests.conftest import bearer, jpeg
+
+COLORS = [(200, 30, 30), (30, 200, 30), (30, 30, 200), (200, 200, 30)]
+
+
+def batch(client, images, keys=None, user="user-1"):
+    files = [("files", (f"img{i}.jpg", data, "image/jpeg")) for i, data in enumerate(images)]
+    items = [{"idempotency_key": k} for k in keys] if keys else [{} for _ in images]
+    return client.post("/fish/identify-batch", files=files, data={"items": json.dumps(items)}, headers=bearer(user))
+
+
+def count(model) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(model).count()
+    finally:
+        db.close()
+
+
+def test_batch_saves_every_item_in_one_commit(api, monkeypatch):
+    jobs = []
+
+    async def enrich_later(batch_jobs):
+        jobs.extend(batch_jobs)
+
+    monkeypatch.setattr(enrich_service, "enrich_catches", enrich_later)
+    commits = []
+    listener = lambda conn: commits.append(conn)
+    event.listen(async_engine.sync_engine, "commit", listener)
+    try:
+        r = api(lambda c: batch(c, [jpeg(col) for col in COLORS[:3]], ["k1", "k2", "k3"]))
+    finally:
+        event.remove(async_engine.sync_engine, "commit", listener)
+
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["created"], body["replayed"], body["failed"]) == (3, 0, 0)
+    assert [x["index"] for x in body["results"]] == [0, 1, 2]
+    assert all(x["status"] == "pending" and x["saved_path"] is None for x in body["results"])
+    assert len(commits) == 1  # catches, species links and idempotency records together
+    assert count(models.Catch) == 3 and count(models.IdempotencyRecord) == 3
+    assert sorted(j["catch_id"] for j in jobs) == sorted(x["catch_id"] for x in body["results"])
+
+
+def test_known_keys_are_replayed(api):
+    async def run(client):
+        first = await batch(client, [jpeg(COLORS[0]), jpeg(COLORS[1])], ["k1", "k2"])
+        again = await batch(client, [jpeg(COLORS[0]), jpeg(COLORS[2])], ["k1", "k3"])
+        return first.json(), again.json()
+
+    first, again = api(run)
+    k1, k3 = again["results"]
+    assert k1["replayed"] is True and k1["catch_id"] == first["results"][0]["catch_id"]
+    # rebuilt from the catch row: the background stage has finished since the first response
+    assert k1["status"] == "ready" and k1["saved_path"]
+    assert k3["replayed"] is False and k3["catch_id"] not in {x["catch_id"] for x in first["results"]}
+    assert (again["created"], again["replayed"]) == (1, 1)
+    assert count(models.Catch) == 3
+
+
+def test_keys_are_per_user(api):
+    async def run(client):
+        await batch(client, [jpeg()], ["shared"], user="user-1")
+        return (await batch(client, [jpeg()], ["shared"], user="user-2")).json()
+
+    other = api(run)
+    assert other["created"] == 1 and other["replayed"] == 0
+    assert count(models.Catch) == 2
+
+
+def test_duplicate_key_within_a_batch_saves_once(api):
+    body = api(lambda c: batch(c, [jpeg(COLORS[0]), jpeg(COLORS[0])], ["dup", "dup"])).json()
+    first, second = body["results"]
+    assert first["replayed"] is False and second["replayed"] is True
+    assert second["catch_id"] == first["catch_id"] and second["index"] == 1
+    assert (body["created"], body["replayed"]) == (1, 1)
+    assert count(models.Catch) == 1
+
+
+def test_item_errors_do_not_fail_the_batch(api):
+    images = [
+        jpeg(COLORS[0]),
+        b"GIF89a" + b"\x00" * 64,                       # 415: not JPEG/PNG/WebP
+        b"\xff\xd8\xff\xe0" + b"\x00" * MAX_BYTES,      # 413: over the per-image limit
+        b"\xff\xd8\xff\xe0" + b"not really a jpeg" * 8,  # 422: sniffs as JPEG, fails to decode
+    ]
+    body = api(lambda c: batch(c, images, ["ok", "gif", "big", "broken"])).json()
+    ok, gif, big, broken = body["results"]
+    assert ok["catch_id"] and "error" not in ok
+    assert gif["status_code"] == 415 and big["status_code"] == 413 and broken["status_code"] == 422
+    assert (body["created"], body["failed"]) == (1, 3)
+    assert count(models.Catch) == 1
+    # failed items record no key, so a corrected retry is processed normally
+    assert count(models.IdempotencyRecord) == 1
+
+
+def test_key_committed_concurrently_is_409_and_saves_nothing(api, monkeypatch):
+    api(lambda c: batch(c, [jpeg(COLORS[0])], ["k1"]))
+    # as if another request recorded k1 between this request's lookup and its commit
+    monkeypatch.setattr(idempotency_service, "lookup", lambda db, user_id, keys: {})
+
+    r = api(lambda c: batch(c, [jpeg(COLORS[1]), jpeg(COLORS[2])], ["k2", "k1"]))
+    assert r.status_code == 409
+    assert count(models.Catch) == 1  # k2 rolled back with k1
+    assert count(models.IdempotencyRecord) == 1
+
+
+@pytest.mark.parametrize("items, detail", [
+    ("not json", "Invalid items"),
+    (json.dumps([{}]), "one object per file"),
+])
+def test_malformed_items_are_rejected(api, items, detail):
+    files = [("files", ("a.jpg", jpeg(), "image/jpeg")), ("files", ("b.jpg", jpeg(), "image/jpeg"))]
+    r = api(lambda c: c.post("/fish/identify-batch", files=files, data={"items": items}, headers=bearer()))
+    assert r.status_code == 400 and detail in r.json()["detail"]
+
+
+def test_requires_sign_in(api):
+    r = api(lambda c: c.post("/fish/identify-batch", files=[("files", ("a.jpg", jpeg(), "image/jpeg"))]))
+    assert r.status_code == 401
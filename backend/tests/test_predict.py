@@ -0,0 +1,47 @@
+# backend/tests/test_predict.py
+# Micro-batcher dispatch bookkeeping and the /predict/stats endpoint.
+
+import asyncio
+
+from PIL import Image
+
+from backend.tests.conftest import bearer
+from ml import batching
+
+
+class GatedExecutor:
+    """Inference that waits for `release`, so dispatches stay in flight."""
+    workers = 2
+
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def predict_batch(self, imgs, k):
+        await self.release.wait()
+        return [{"label": "Bass", "confidence": 1.0}] * len(imgs)
+
+
+def test_batcher_holds_dispatches_until_they_finish(monkeypatch):
+    executor = GatedExecutor()
+    monkeypatch.setattr(batching, "get_executor", lambda: executor)
+    batcher = batching.MicroBatcher(max_batch_size=2, max_wait_ms=1)
+
+    async def go():
+        img = Image.new("RGB", (32, 32))
+        pending = [asyncio.ensure_future(batcher.submit(img)) for _ in range(4)]
+        await asyncio.sleep(0.05)
+        held = len(batcher._dispatches)
+        executor.release.set()
+        results = await asyncio.gather(*pending)
+        await asyncio.sleep(0)  # done callbacks
+        return held, results
+
+    held, results = asyncio.run(go())
+    assert held == 2 and len(results) == 4
+    assert not batcher._dispatches
+
+
+def test_predict_stats_requires_sign_in(api):
+    assert api(lambda c: c.get("/predict/stats")).status_code == 401
+    r = api(lambda c: c.get("/predict/stats", headers=bearer()))
+    assert r.status_code == 200 and "batches" in r.json()
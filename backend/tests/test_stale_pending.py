@@ -0,0 +1,87 @@
+# backend/tests/test_stale_pending.py
+# Catches whose background stage never ran (process died holding the image bytes):
+# the sweep settles them, and a retry with the same key re-uploads the photo.
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from backend import models
+from backend.database import SessionLocal
+from backend.services import catch_service, enrich_service, idempotency_service
+from backend.tests.conftest import bearer, jpeg
+
+PHOTO = jpeg((200, 30, 30))
+
+
+def lost_catch(key: str = "k1", image_path: str = "", age_s: int = 3600) -> int:
+    """A catch reserved `age_s` ago whose enrichment never happened, plus its idempotency record."""
+    db = SessionLocal()
+    try:
+        catch = catch_service.add_catch(
+            db, "user-1", image_path=image_path, image_hash=hashlib.sha256(PHOTO).hexdigest(),
+            species_label="Bass", species_confidence=0.9, status="pending",
+        )
+        catch.created_at = datetime.utcnow() - timedelta(seconds=age_s)
+        response = {"catch_id": catch.id, "status": "pending", "saved_path": None, "lat": None, "lng": None}
+        idempotency_service.record(db, "user-1", key, catch.id, response)
+        db.commit()
+        return catch.id
+    finally:
+        db.close()
+
+
+def status_of(catch_id: int):
+    db = SessionLocal()
+    try:
+        catch = db.get(models.Catch, catch_id)
+        return catch.status, catch.image_path
+    finally:
+        db.close()
+
+
+def test_sweep_settles_only_stale_catches(fresh_db):
+    lost = lost_catch("k1")
+    stored = lost_catch("k2", image_path="/assets/uploads/x.jpg")
+    recent = lost_catch("k3", age_s=5)
+
+    enrich_service.settle_stale()
+
+    assert status_of(lost) == ("failed", "")
+    assert status_of(stored)[0] == "ready"      # only the weather was missing
+    assert status_of(recent)[0] == "pending"    # its background stage may still be running
+
+
+def test_retry_stores_the_photo_for_the_failed_catch(api):
+    catch_id = lost_catch()
+    enrich_service.settle_stale()
+
+    def identify(client, photo):
+        return client.post("/fish/identify", files={"file": ("a.jpg", photo, "image/jpeg")},
+                           data={"local_id": "k1"}, headers=bearer())
+
+    other = api(lambda c: identify(c, jpeg((30, 30, 200)))).json()
+    assert other["replayed"] is True and other["status"] == "failed"  # a different photo is not adopted
+
+    body = api(lambda c: identify(c, PHOTO)).json()
+    assert body["replayed"] is True and body["catch_id"] == catch_id and body["status"] == "pending"
+    status, image_path = status_of(catch_id)
+    assert status == "ready" and image_path
+    db = SessionLocal()
+    try:
+        assert db.query(models.Catch).count() == 1
+    finally:
+        db.close()
+
+
+def test_batch_retry_stores_the_photo_for_the_failed_catch(api):
+    catch_id = lost_catch()
+    enrich_service.settle_stale()
+
+    files = [("files", ("a.jpg", PHOTO, "image/jpeg"))]
+    items = json.dumps([{"idempotency_key": "k1"}])
+    body = api(lambda c: c.post("/fish/identify-batch", files=files, data={"items": items}, headers=bearer())).json()
+
+    (item,) = body["results"]
+    assert item["replayed"] is True and item["catch_id"] == catch_id and item["status"] == "pending"
+    assert status_of(catch_id)[0] == "ready"
@@ -0,0 +1,24 @@
+# backend/tests/test_storage.py
+# Local blob writes: concurrent writers of the same content-addressed blob.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from backend import storage
+from backend.tests.conftest import jpeg
+
+
+def test_concurrent_writes_of_one_blob_publish_a_complete_file():
+    data = jpeg(size=(400, 300))
+    digest = storage.content_hash(data)
+    path = os.path.join(storage.SAVE_DIR, storage.blob_name(digest, "image/jpeg"))
+
+    def write(_):
+        storage._write_atomic(path, data)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(write, range(32)))  # raises if any writer failed
+
+    with open(path, "rb") as f:
+        assert f.read() == data
+    assert not [n for n in os.listdir(os.path.dirname(path)) if n.endswith(".tmp")]
@@ -0,0 +1,138 @@
+# backend/tests/test_weather_service.py
+# fetch_weather against an httpx.MockTransport stand-in for Open-Meteo.
+
+import asyncio
+
+import httpx
+import pytest
+
+from backend.services import weather_service
+
+SNAPSHOT = {"current": {"temperature_2m": 14.2, "wind_speed_10m": 9.0, "weather_code": 3}}
+
+
+class Upstream:
+    """Counts calls; answers SNAPSHOT (after `delay`), `status` when failing, or refuses (status None)."""
+
+    def __init__(self):
+        self.calls = []
+        self.status = 200
+        self.delay = 0.0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(request)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.status is None:
+            raise httpx.ConnectError("connection refused", request=request)
+        if self.status != 200:
+            return httpx.Response(self.status, json={"error": True})
+        return httpx.Response(200, json=SNAPSHOT)
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    stub = Upstream()
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(weather_service.httpx, "AsyncClient",
+                        lambda **kw: real_client(transport=httpx.MockTransport(stub), **kw))
+    weather_service._cache.clear()
+    asyncio.run(weather_service.close_client())
+    yield stub
+    asyncio.run(weather_service.close_client())
+    weather_service._cache.clear()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock(1_000 * weather_service.BUCKET_S + 10)
+    monkeypatch.setattr(weather_service, "time", c)
+    return c
+
+
+def test_same_grid_cell_is_served_from_cache(upstream, clock):
+    async def run():
+        first = await weather_service.fetch_weather(42.3601, -71.0589)
+        nearby = await weather_service.fetch_weather(42.3612, -71.0577)  # same 0.1° cell
+        return first, nearby
+
+    first, nearby = asyncio.run(run())
+    assert first == SNAPSHOT and nearby == SNAPSHOT
+    assert len(upstream.calls) == 1
+    # the cell centre is queried, not the catch position
+    params = upstream.calls[0].url.params
+    assert float(params["latitude"]) == pytest.approx(42.35)
+    assert float(params["longitude"]) == pytest.approx(-71.05)
+
+
+def test_other_cell_is_a_separate_lookup(upstream, clock):
+    async def run():
+        await weather_service.fetch_weather(42.36, -71.06)
+        await weather_service.fetch_weather(41.50, -70.60)
+
+    asyncio.run(run())
+    assert len(upstream.calls) == 2
+
+
+def test_snapshot_expires_with_the_time_bucket(upstream, clock):
+    async def run():
+        await weather_service.fetch_weather(42.36, -71.06)
+        clock.now += weather_service.BUCKET_S - 20  # still the same bucket
+        await weather_service.fetch_weather(42.36, -71.06)
+        clock.now += 20                             # next bucket
+        await weather_service.fetch_weather(42.36, -71.06)
+
+    asyncio.run(run())
+    assert len(upstream.calls) == 2
+
+
+def test_concurrent_lookups_share_one_upstream_call(upstream, clock):
+    upstream.delay = 0.05
+
+    async def run():
+        return await asyncio.gather(*(weather_service.fetch_weather(42.36 + i * 0.001, -71.06) for i in range(10)))
+
+    results = asyncio.run(run())
+    assert results == [SNAPSHOT] * 10
+    assert len(upstream.calls) == 1
+
+
+@pytest.mark.parametrize("status", [500, 429])
+def test_upstream_error_returns_none_and_is_not_cached(upstream, clock, status):
+    upstream.status = status
+
+    async def run():
+        failed = await weather_service.fetch_weather(42.36, -71.06)
+        upstream.status = 200
+        retried = await weather_service.fetch_weather(42.36, -71.06)
+        return failed, retried
+
+    failed, retried = asyncio.run(run())
+    assert failed is None
+    assert retried == SNAPSHOT
+    assert len(upstream.calls) == 2
+
+
+def test_transport_error_returns_none(upstream, clock):
+    upstream.status = None  # connection refused
+
+    assert asyncio.run(weather_service.fetch_weather(42.36, -71.06)) is None
+    assert weather_service._inflight == {}
+
+
+def test_client_from_a_previous_loop_is_closed(upstream, clock):
+    async def client():
+        return await weather_service._get_client()
+
+    old = asyncio.run(client())
+    new = asyncio.run(client())
+    assert new is not old
+    assert old.is_closed and not new.is_closed
@@ -41,7 +41,7 @@ import { addLocalCatch, updateLocalCatch, LocalCatch } from "@/lib/storage";
 //import { getUserId } from "@/lib/user";
 
 import { useAuth } from "@/contexts/AuthContext";
-import { identifyFish, getAuthHeaders } from "@/lib/api";
+import { identifyFish, getAuthHeaders, waitForCatch } from "@/lib/api";
 import { supabase } from "@/lib/supabase";
 
 // ✅ 引入常量和数据
@@ -389,6 +389,7 @@ export default function Home() {
   const [selectedSpecies, setSelectedSpecies] = useState<string | null>(null);
 
   const [serverImagePath, setServerImagePath] = useState<string | null>(null);
+  const activeCatchId = React.useRef<number | null>(null);  // catch whose server image we're waiting for
   const [localImageUri, setLocalImageUri] = useState<string | null>(null);
   const [prediction, setPrediction] = useState<{ label?: string; confidence?: number } | null>(null);
   const [lastLocalId, setLastLocalId] = useState<string | null>(null);
@@ -535,7 +536,7 @@ export default function Home() {
   // Image Upload Logic (Keep mostly same as it relies on local component state)
   const pickAndUpload = async (useCamera: boolean) => {
     console.log("🔍 API_BASE is:", API_BASE); 
-    setPrediction(null); setServerImagePath(null); setLocalImageUri(null); setLastLocalId(null); setLastRemoteId(null); setSelectedSpecies(null); setQuery("");
+    setPrediction(null); setServerImagePath(null); setLocalImageUri(null); setLastLocalId(null); setLastRemoteId(null); setSelectedSpecies(null); setQuery(""); activeCatchId.current = null;
     
     let res;
     if (useCamera) {
@@ -578,21 +579,39 @@ export default function Home() {
       //const j: IdentifyResponse = await r.json();
 
       
+      // Also the idempotency key. The local catch is stored (unsynced) before the request,
+      // so if it times out after the server saved it, sync.ts retries with the same key
+      // and gets that catch back instead of a duplicate.
+      const localId = `${Date.now()}-${Math.random().toString(36).slice(2, 8)}`;
+      const lc: LocalCatch = { local_id: localId, local_uri: uri, species_label: "Unknown", species_confidence: 0, created_at: new Date().toISOString(), synced: false, lat: lat ?? null, lng: lng ?? null };
+      await addLocalCatch(lc);
+      setLastLocalId(localId);
+
       const j = await identifyFish(uri, {
         persist: !!userId,
         latitude: lat,
         longitude: lng,
+        idempotencyKey: localId,
       });
       
       setServerImagePath(j.saved_path ?? null);
       setPrediction(j.prediction || null);
       setLastRemoteId(j.catch_id ?? null);
+      // The server stores the image (and weather) after replying: show its copy once ready
+      const catchId = j.catch_id;
+      activeCatchId.current = catchId ?? null;
+      if (catchId && j.status === "pending") {
+        waitForCatch(catchId).then((c) => {
+          if (c?.image_path && activeCatchId.current === catchId) setServerImagePath(c.image_path);
+          // The server lost the photo before storing it: sync.ts re-uploads it under the
+          // same key (localId), which stores it for this same catch
+          if (c?.status === "failed" && !c.image_path) updateLocalCatch(localId, { synced: false, remote_id: null });
+        });
+      }
       const pred = (j.prediction?.label || "").trim();
       setSelectedSpecies(species.some((s) => s.common_name.toLowerCase() === pred.toLowerCase()) ? pred : null);
       
-      const lc: LocalCatch = { local_id: `${Date.now()}-${Math.random().toString(36).slice(2, 8)}`, local_uri: uri, species_label: pred || "Unknown", species_confidence: Number(j.prediction?.confidence ?? 0), created_at: new Date().toISOString(), remote_id: j.catch_id ?? undefined, synced: !!userId && !!j.catch_id } as LocalCatch;
-      await addLocalCatch(lc);
-      setLastLocalId(lc.local_id);
+      await updateLocalCatch(localId, { species_label: pred || "Unknown", species_confidence: Number(j.prediction?.confidence ?? 0), remote_id: j.catch_id ?? undefined, synced: !!userId && !!j.catch_id });
 // ✅ 成功提示
       Toast.show({
         type: 'success',
@@ -622,7 +641,7 @@ export default function Home() {
     setConfirmOpen(false);
     
     const savedSpecies = selectedSpecies;
-    setLocalImageUri(null); setServerImagePath(null); setPrediction(null); setSelectedSpecies(null); setLastLocalId(null); setLastRemoteId(null);
+    setLocalImageUri(null); setServerImagePath(null); setPrediction(null); setSelectedSpecies(null); setLastLocalId(null); setLastRemoteId(null); activeCatchId.current = null;
     showRegulations(savedSpecies);
   };
 
@@ -16,7 +16,10 @@ type CatchCardProps = {
 
 export default function CatchCard({ item, onPress, showRarity = false }: CatchCardProps) {
   // 处理图片路径：如果是本地文件直接用，如果是远程则拼接 API_BASE 并加缓存戳
-  const uri = item.image_path?.startsWith("file://")
+  // (image_path is null while the server is still storing a new catch's photo: placeholder only)
+  const uri = !item.image_path
+    ? undefined
+    : item.image_path.startsWith("file://")
     ? item.image_path
     : bust(`${API_BASE}${item.image_path}`);
 
@@ -213,7 +213,11 @@ export async function apiPost<T>(endpoint: string, data: any): Promise<T> {
  * Make an authenticated POST request with FormData (for file uploads)
  * ✅ FIX: Don't set Content-Type - fetch sets it automatically with boundary
  */
-export async function apiPostForm<T>(endpoint: string, formData: FormData): Promise<T> {
+export async function apiPostForm<T>(
+  endpoint: string,
+  formData: FormData,
+  extraHeaders: Record<string, string> = {}
+): Promise<T> {
   const base = API_BASE.replace(/\/+$/, "");
   const authHeaders = await getAuthHeaders();
 
@@ -226,7 +230,7 @@ export async function apiPostForm<T>(endpoint: string, formData: FormData): Prom
     `${base}${endpoint}`,
     {
       method: "POST",
-      headers: authHeaders,  // No Content-Type here!
+      headers: { ...authHeaders, ...extraHeaders },  // No Content-Type here!
       body: formData,
     },
     UPLOAD_TIMEOUT
@@ -302,7 +306,9 @@ export async function apiDelete(endpoint: string): Promise<void> {
 
 export type CatchRead = {
   id: number;
-  image_path: string;
+  image_path: string | null;    // null while status is "pending" (or if "failed")
+  thumb_path?: string | null;   // 128px WebP, null for older catches
+  medium_path?: string | null;  // 512px WebP, null for older catches
   species_label: string;
   species_confidence: number;
   created_at: string;
@@ -310,6 +316,7 @@ export type CatchRead = {
   lat?: number | null;
   lng?: number | null;
   weather_json?: string | null;
+  status?: "pending" | "ready" | "failed";
 };
 
 export async function getCatches(limit: number = 200): Promise<CatchRead[]> {
@@ -324,6 +331,28 @@ export async function getCatch(catchId: number): Promise<CatchRead> {
   return apiGet<CatchRead>(`/catches/${catchId}`);
 }
 
+/**
+ * Poll a just-saved catch until the server has stored its image and weather
+ * (/fish/identify answers with status "pending" and saved_path/weather null).
+ * Resolves with the finished catch, or null on timeout / network error.
+ */
+export async function waitForCatch(
+  catchId: number,
+  { intervalMs = 1500, timeoutMs = 30000 }: { intervalMs?: number; timeoutMs?: number } = {}
+): Promise<CatchRead | null> {
+  const deadline = Date.now() + timeoutMs;
+  while (Date.now() < deadline) {
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    try {
+      const c = await getCatch(catchId);
+      if (c.status !== "pending") return c;
+    } catch {
+      return null;
+    }
+  }
+  return null;
+}
+
 export async function updateCatch(
   catchId: number,
   data: { species_label?: string; species_confidence?: number }
@@ -345,6 +374,8 @@ export async function identifyFish(
     persist?: boolean;
     latitude?: number;
     longitude?: number;
+    // Same key on a retry => the server returns the first result instead of a duplicate catch
+    idempotencyKey?: string;
   } = {}
 ): Promise<{
   file_name: string;
@@ -356,6 +387,8 @@ export async function identifyFish(
   lat: number | null;
   lng: number | null;
   weather: any | null;
+  status?: "pending" | "ready" | "failed";  // "pending": poll waitForCatch(catch_id)
+  replayed?: boolean;
   authenticated?: boolean;
   user_id?: string;
 }> {
@@ -391,7 +424,11 @@ export async function identifyFish(
     });
   }
 
-  return apiPostForm("/fish/identify", formData);
+  return apiPostForm(
+    "/fish/identify",
+    formData,
+    options.idempotencyKey ? { "Idempotency-Key": options.idempotencyKey } : {}
+  );
 }
 
 // ============================================
@@ -19,9 +19,14 @@ async function getAuthHeaders(): Promise<Record<string, string>> {
   return {};
 }
 
+// Max files per /fish/identify-batch request (server default IDENTIFY_BATCH_MAX=16)
+const BATCH_SIZE = 10;
+
 /**
  * Sync pending local catches to the server
  * Now uses JWT auth instead of X-User-Id header
+ * Uploads in batches via /fish/identify-batch; local_id is the idempotency key,
+ * so a retry after a timeout never creates duplicate catches.
  */
 export async function syncPending(userId: string): Promise<void> {
   if (!userId) return;
@@ -29,28 +34,35 @@ export async function syncPending(userId: string): Promise<void> {
   const locals = await getLocalCatches();
   const pending = locals.filter((c) => !c.synced && !c.remote_id);
 
-  for (const local of pending) {
+  for (let start = 0; start < pending.length; start += BATCH_SIZE) {
+    const chunk = pending.slice(start, start + BATCH_SIZE);
     try {
       const form = new FormData();
-      form.append("file", {
-        uri: local.local_uri,
-        name: `catch-${Date.now()}.jpg`,
-        type: "image/jpeg",
-      } as unknown as Blob);
-
-      // ✅ FIX: Only append fields that /fish/identify accepts
-      // The backend re-runs inference, so species_label/confidence aren't needed
-      form.append("persist", "true");
-      
-      // Include geo coords if available
-      if (local.lat != null) form.append("latitude", String(local.lat));
-      if (local.lng != null) form.append("longitude", String(local.lng));
+      for (const local of chunk) {
+        form.append("files", {
+          uri: local.local_uri,
+          name: `catch-${local.local_id}.jpg`,
+          type: "image/jpeg",
+        } as unknown as Blob);
+      }
+      // One metadata object per file, same order. The backend re-runs inference,
+      // so species_label/confidence aren't sent.
+      form.append(
+        "items",
+        JSON.stringify(
+          chunk.map((local) => ({
+            idempotency_key: local.local_id,
+            latitude: local.lat ?? null,
+            longitude: local.lng ?? null,
+          }))
+        )
+      );
 
       // ✅ Use JWT auth header instead of X-User-Id
       const authHeaders = await getAuthHeaders();
 
       // ✅ FIX: Don't set Content-Type for FormData
-      const resp = await fetch(`${API_BASE}/fish/identify`, {
+      const resp = await fetch(`${API_BASE}/fish/identify-batch`, {
         method: "POST",
         headers: {
           Accept: "application/json",
@@ -59,19 +71,28 @@ export async function syncPending(userId: string): Promise<void> {
         body: form,
       });
 
-      if (resp.ok) {
-        const data = await resp.json();
-        await updateLocalCatch(local.local_id, {
-          synced: true,
-          remote_id: data.catch_id,
-        });
-        console.log(`✅ Synced local catch ${local.local_id} -> remote ${data.catch_id}`);
-      } else {
+      if (!resp.ok) {
         const errText = await resp.text().catch(() => "");
-        console.warn(`❌ Sync failed for ${local.local_id}: ${resp.status} ${errText}`);
+        console.warn(`❌ Batch sync failed (${chunk.length} catches): ${resp.status} ${errText}`);
+        continue;
+      }
+
+      const data = await resp.json();
+      for (const item of data.results ?? []) {
+        const local = chunk[item.index];
+        if (!local) continue;
+        if (item.catch_id) {
+          await updateLocalCatch(local.local_id, {
+            synced: true,
+            remote_id: item.catch_id,
+          });
+          console.log(`✅ Synced local catch ${local.local_id} -> remote ${item.catch_id}`);
+        } else {
+          console.warn(`❌ Sync failed for ${local.local_id}: ${item.status_code ?? ""} ${item.error ?? ""}`);
+        }
       }
     } catch (e) {
-      console.warn("Sync failed for", local.local_id, e);
+      console.warn("Batch sync failed", e);
     }
   }
 }
@@ -0,0 +1,141 @@
+# ml/batching.py
+from __future__ import annotations
+import asyncio, os, time
+from typing import Dict, List, Optional, Set, Tuple
+
+from PIL import Image
+
+from .executor import get_executor
+
+
+# ---------- Config ----------
+# A batch is dispatched as soon as it is full or the oldest request has waited MAX_WAIT_MS.
+MAX_BATCH_SIZE = int(os.getenv("INFER_MAX_BATCH", "8"))
+MAX_WAIT_MS = float(os.getenv("INFER_MAX_WAIT_MS", "5"))
+# Batches allowed to run at the same time; defaults to one per inference worker
+MAX_INFLIGHT = int(os.getenv("INFER_MAX_INFLIGHT", "0"))
+
+
+# ---------- Scheduler ----------
+class MicroBatcher:
+    """
+    Collects concurrent predict requests for a few milliseconds and runs them
+    through FishIDModel.predict_batch as one forward pass.
+    Each caller awaits its own top-k result.
+    """
+
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS,
+                 max_inflight: int = MAX_INFLIGHT, k: int = 3):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_inflight = max_inflight if max_inflight > 0 else get_executor().workers
+        self.k = k
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        # the loop only keeps weak references to tasks: hold dispatches until they finish
+        self._dispatches: Set[asyncio.Task] = set()
+
+        # metrics
+        self._requests = 0
+        self._batches = 0
+        self._batch_sizes: Dict[int, int] = {}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._infer_total = 0.0
+
+    def _ensure_started(self) -> asyncio.Queue:
+        # Queue/Task are bound to the loop that created them; rebuild if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_inflight)
+            self._dispatches = set()
+            self._worker = loop.create_task(self._run())
+        return self._queue
+
+    async def submit(self, img: Image.Image) -> dict:
+        queue = self._ensure_started()
+        fut = self._loop.create_future()
+        await queue.put((img, fut, time.perf_counter()))
+        return await fut
+
+    async def _run(self):
+        queue, loop = self._queue, self._loop
+        while True:
+            # wait for a free slot first, so requests keep piling into the next batch meanwhile
+            await self._slots.acquire()
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    if timeout <= 0:
+                        batch.append(queue.get_nowait())
+                    else:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+            task = loop.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Image.Image, asyncio.Future, float]]):
+        try:
+            live = [item for item in batch if not item[1].done()]  # skip cancelled callers
+            if not live:
+                return
+            started = time.perf_counter()
+            for _, _, enqueued in live:
+                wait = started - enqueued
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+            self._requests += len(live)
+            self._batches += 1
+            self._batch_sizes[len(live)] = self._batch_sizes.get(len(live), 0) + 1
+
+            imgs = [img for img, _, _ in live]
+            try:
+                results = await get_executor().predict_batch(imgs, self.k)
+            except Exception as e:
+                for _, fut, _ in live:
+                    if not fut.done():
+                        fut.set_exception(e)
+                return
+            finally:
+                self._infer_total += time.perf_counter() - started
+
+            for (_, fut, _), res in zip(live, results):
+                if not fut.done():
+                    fut.set_result(res)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        """Batch-size and queue-wait metrics since startup."""
+        n, b = self._requests, self._batches
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "requests": n,
+            "batches": b,
+            "avg_batch_size": n / b if b else 0.0,
+            "batch_size_hist": dict(sorted(self._batch_sizes.items())),
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "avg_queue_wait_ms": self._wait_total / n * 1000.0 if n else 0.0,
+            "max_queue_wait_ms": self._wait_max * 1000.0,
+            "avg_batch_infer_ms": self._infer_total / b * 1000.0 if b else 0.0,
+        }
+
+
+# Singleton, like get_model()
+_BATCHER: Optional[MicroBatcher] = None
+
+def get_batcher() -> MicroBatcher:
+    global _BATCHER
+    if _BATCHER is None:
+        _BATCHER = MicroBatcher()
+    return _BATCHER
@@ -0,0 +1,101 @@
+# ml/benchmarks.py
+# Micro-benchmarks for the inference pipeline.
+#   python -m ml.benchmarks preprocess
+#   python -m ml.benchmarks decode
+from __future__ import annotations
+import argparse, time
+from io import BytesIO
+from typing import Callable, List
+
+import numpy as np
+from PIL import Image
+
+from .model import MockClassifier, Taxonomy, SPECIES_CSV, CLASSES_TXT
+from .predict import INPUT_SIZE, decode_image
+
+
+def _timeit(fn: Callable[[], object], repeat: int) -> float:
+    """Best-of-repeat wall time in ms (after one warm-up call)."""
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def _random_images(n: int, size: int) -> List[Image.Image]:
+    rng = np.random.default_rng(0)
+    return [Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8)) for _ in range(n)]
+
+
+def bench_preprocess(batch_sizes=(1, 8, 32), repeat: int = 20):
+    """Per-image preprocess + np.stack vs. preprocess_batch into the reusable buffer."""
+    clf = MockClassifier(Taxonomy(SPECIES_CSV, classes_txt=CLASSES_TXT))
+    s = clf.input_size
+    print(f"{'batch':>5} {'per-image ms':>13} {'batch ms':>9} {'speedup':>8}")
+    for n in batch_sizes:
+        imgs = _random_images(n, s)  # already at input_size: measures normalize/transpose/stack only
+        ref = np.stack([clf.preprocess(img) for img in imgs])
+        assert np.allclose(ref, clf.preprocess_batch(imgs), atol=1e-5)
+        t_old = _timeit(lambda: np.stack([clf.preprocess(img) for img in imgs]), repeat)
+        t_new = _timeit(lambda: clf.preprocess_batch(imgs), repeat)
+        print(f"{n:>5} {t_old:>13.3f} {t_new:>9.3f} {t_old / t_new:>7.1f}x")
+
+
+def _full_decode(data: bytes) -> Image.Image:
+    # the pre-draft path: decode at full resolution, then resize
+    return Image.open(BytesIO(data)).convert("RGB").resize((INPUT_SIZE, INPUT_SIZE))
+
+
+def _photo(fmt: str, w: int = 4032, h: int = 3024) -> bytes:
+    """A 12 MP phone-sized test image with some texture, so the encoder can't cheat."""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:h, 0:w]
+    arr = np.stack([(xx * 255 // w), (yy * 255 // h), ((xx + yy) % 256)], axis=-1).astype(np.int16)
+    arr += rng.integers(-20, 20, arr.shape, dtype=np.int16)
+    buf = BytesIO()
+    Image.fromarray(arr.clip(0, 255).astype(np.uint8)).save(buf, fmt, quality=90)
+    return buf.getvalue()
+
+
+def _vm_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for ln in f:
+            if ln.startswith(field + ":"):
+                return int(ln.split()[1])
+    return 0
+
+
+def _peak_rss_mb(fn_name: str, data: bytes) -> float:
+    """Peak RSS growth while decoding (Linux: VmHWM, reset through clear_refs)."""
+    fn = {"full": _full_decode, "draft": decode_image}[fn_name]
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")  # reset the high-water mark to the current RSS
+    before = _vm_kb("VmRSS")
+    fn(data)
+    return (_vm_kb("VmHWM") - before) / 1024.0
+
+
+def bench_decode(repeat: int = 5):
+    """Full decode + resize vs. draft-mode decode, latency and peak RSS growth."""
+    print(f"{'format':>6} {'size KB':>8} {'full ms':>8} {'draft ms':>9} {'full +RSS MB':>13} {'draft +RSS MB':>14}")
+    for fmt in ("JPEG", "PNG", "WEBP"):
+        data = _photo(fmt)
+        t_full = _timeit(lambda: _full_decode(data), repeat)
+        t_draft = _timeit(lambda: decode_image(data), repeat)
+        rss_full = _peak_rss_mb("full", data)
+        rss_draft = _peak_rss_mb("draft", data)
+        print(f"{fmt:>6} {len(data) // 1024:>8} {t_full:>8.1f} {t_draft:>9.1f} {rss_full:>13.1f} {rss_draft:>14.1f}")
+
+
+BENCHES = {
+    "preprocess": bench_preprocess,
+    "decode": bench_decode,
+}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Inference pipeline micro-benchmarks")
+    ap.add_argument("bench", choices=sorted(BENCHES))
+    BENCHES[ap.parse_args().bench]()
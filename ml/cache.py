@@ -0,0 +1,156 @@
+# ml/cache.py
+from __future__ import annotations
+import asyncio, json, os, tempfile, threading, time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+# ---------- Config ----------
+CACHE_SIZE = int(os.getenv("PRED_CACHE_SIZE", "2048"))       # entries kept in memory
+CACHE_TTL_S = float(os.getenv("PRED_CACHE_TTL", "86400"))    # seconds
+CACHE_DIR = os.getenv("PRED_CACHE_DIR")                       # optional on-disk tier, survives restarts
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of prediction results keyed by "<model_version>:<image sha256>".
+    Values are stored as JSON text, so callers always get a fresh dict they can mutate.
+    With disk_dir set, entries are also written to <disk_dir>/<digest[:2]>/<key>.json and
+    reloaded into memory on a miss. Async callers use aget()/aput(), which do the
+    disk I/O in a worker thread instead of on the event loop.
+    """
+
+    def __init__(self, max_entries: int = CACHE_SIZE, ttl_s: float = CACHE_TTL_S,
+                 disk_dir: Optional[str] = CACHE_DIR):
+        self.max_entries = max(1, max_entries)
+        self.ttl_s = ttl_s
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+        self._mem: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model_version: str, digest: str) -> str:
+        return f"{model_version}:{digest}"
+
+    def _disk_path(self, key: str) -> Path:
+        name = key.replace(":", "_")
+        return self.disk_dir / name[-64:-62] / f"{name}.json"  # shard by digest prefix
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        found, value = self._mem_get(key, now)
+        if found:
+            return value
+        return self._disk_load(key, self._disk_get(key, now), now)
+
+    async def aget(self, key: str) -> Optional[dict]:
+        """get() without blocking the event loop on the disk tier."""
+        now = time.time()
+        found, value = self._mem_get(key, now)
+        if found:
+            return value
+        text = await asyncio.to_thread(self._disk_get, key, now) if self.disk_dir else None
+        return self._disk_load(key, text, now)
+
+    def put(self, key: str, value: dict):
+        text = self._mem_store(key, value)
+        if self.disk_dir:
+            self._disk_put(key, text)
+
+    async def aput(self, key: str, value: dict):
+        """put() with the disk write in a worker thread."""
+        text = self._mem_store(key, value)
+        if self.disk_dir:
+            await asyncio.to_thread(self._disk_put, key, text)
+
+    def _mem_get(self, key: str, now: float) -> Tuple[bool, Optional[dict]]:
+        """(found, value); a miss here still has to check the disk tier."""
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                expires, text = hit
+                if expires > now:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return True, json.loads(text)
+                del self._mem[key]
+        return False, None
+
+    def _disk_load(self, key: str, text: Optional[str], now: float) -> Optional[dict]:
+        with self._lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._mem_put(key, text, now)
+        return json.loads(text)
+
+    def _mem_store(self, key: str, value: dict) -> str:
+        text = json.dumps(value)
+        with self._lock:
+            self._mem_put(key, text, time.time())
+        return text
+
+    def _mem_put(self, key: str, text: str, now: float):
+        self._mem[key] = (now + self.ttl_s, text)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if path.stat().st_mtime + self.ttl_s <= now:
+                path.unlink(missing_ok=True)
+                return None
+            return path.read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def _disk_put(self, key: str, text: str):
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            # unique temp name per writer; os.replace is atomic, so readers never see a half-written file
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent,
+                                             suffix=".tmp", delete=False) as tmp:
+                tmp.write(text)
+            try:
+                os.replace(tmp.name, path)
+            except OSError:
+                os.unlink(tmp.name)
+                raise
+        except OSError:
+            pass  # the disk tier is best effort
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._mem),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "disk": str(self.disk_dir) if self.disk_dir else None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+# Singleton, like get_model()
+_CACHE: Optional[PredictionCache] = None
+
+def get_cache() -> PredictionCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = PredictionCache()
+    return _CACHE
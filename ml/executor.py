@@ -0,0 +1,119 @@
+# ml/executor.py
+from __future__ import annotations
+import asyncio, os, threading
+import multiprocessing as mp
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+from .model import detect_engine, get_model
+
+
+# ---------- Config ----------
+# "auto": threads for ONNX (onnxruntime releases the GIL) and Mock, processes for Torch
+POOL_KIND = os.getenv("INFER_POOL", "auto")
+WORKERS = int(os.getenv("INFER_WORKERS", "2"))
+# Requests admitted at once (decoding, queued or running); beyond that we shed load
+MAX_PENDING = int(os.getenv("INFER_MAX_PENDING", "64"))
+RETRY_AFTER_S = int(os.getenv("INFER_RETRY_AFTER", "1"))
+
+
+class InferenceBusy(Exception):
+    """Raised when the inference queue is full; the API maps it to 503 + Retry-After."""
+
+    def __init__(self, retry_after: int = RETRY_AFTER_S):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+def _init_worker():
+    # Load the model once per worker (no-op for threads after the first one)
+    get_model()
+
+
+def _predict_batch(imgs, k: int):
+    return get_model().predict_batch(imgs, k=k)
+
+
+# ---------- Executor ----------
+class InferenceExecutor:
+    """
+    Keeps image decoding and the forward pass off the event loop.
+    - decode/resize runs on a small thread pool (PIL releases the GIL)
+    - predict_batch runs on a thread pool or a process pool, each worker
+      holding its own model instance loaded via get_model()
+    Admission is bounded: once MAX_PENDING requests are in flight, admit() raises InferenceBusy.
+    """
+
+    def __init__(self, kind: str = POOL_KIND, workers: int = WORKERS, max_pending: int = MAX_PENDING):
+        if kind == "auto":
+            kind = "process" if detect_engine() == "torch" else "thread"
+        if kind not in ("thread", "process"):
+            raise ValueError(f"INFER_POOL must be auto, thread or process, got {kind!r}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+
+        self._pending = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+        self._decode_pool: Optional[Executor] = None
+        self._model_pool: Optional[Executor] = None
+
+    def _pools(self):
+        if self._model_pool is None:
+            self._decode_pool = ThreadPoolExecutor(self.workers, thread_name_prefix="decode")
+            if self.kind == "process":
+                self._model_pool = ProcessPoolExecutor(
+                    self.workers, mp_context=mp.get_context("spawn"), initializer=_init_worker)
+            else:
+                self._model_pool = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix="infer", initializer=_init_worker)
+        return self._decode_pool, self._model_pool
+
+    @contextmanager
+    def admit(self):
+        """Reserve a slot for one request for its whole decode -> batch -> predict lifetime."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise InferenceBusy()
+            self._pending += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def decode(self, fn: Callable[..., Any], *args):
+        pool, _ = self._pools()
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+    async def predict_batch(self, imgs, k: int):
+        _, pool = self._pools()
+        return await asyncio.get_running_loop().run_in_executor(pool, _predict_batch, imgs, k)
+
+    def shutdown(self):
+        for pool in (self._decode_pool, self._model_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._decode_pool = self._model_pool = None
+
+    def stats(self) -> dict:
+        return {
+            "pool": self.kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "rejected": self._rejected,
+        }
+
+
+# Singleton, like get_model()
+_EXECUTOR: Optional[InferenceExecutor] = None
+
+def get_executor() -> InferenceExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = InferenceExecutor()
+    return _EXECUTOR
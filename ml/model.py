@@ -1,8 +1,8 @@
 # ml/model.py
 from __future__ import annotations
-import os, csv, json, hashlib
+import os, csv, json, hashlib, threading
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Sequence, Tuple, Union
 
 import numpy as np
 from PIL import Image
@@ -38,6 +38,12 @@ MODEL_INFO  = DATA / "model.json"  # optional: {"arch":"mobilenetv3_large_100","
 SPECIES_CSV = DATA / "species_ma.csv"   # you placed these already
 SYNONYMS_CSV = DATA / "synonyms_ma.csv" # not used at inference, but good to keep
 
+# ImageNet normalization. (x/255 - mean)/std is folded into one scale + bias per channel.
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD  = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+_NORM_SCALE = (1.0 / (255.0 * IMAGENET_STD)).reshape(3, 1, 1)
+_NORM_BIAS  = (-IMAGENET_MEAN / IMAGENET_STD).reshape(3, 1, 1)
+
 
 # ---------- Taxonomy ----------
 class Taxonomy:
@@ -88,19 +94,49 @@ class _BaseClassifier:
     def __init__(self, taxonomy: Taxonomy, input_size: int = 224):
         self.tax = taxonomy
         self.input_size = input_size
+        self._bufs = threading.local()  # per-thread NCHW scratch buffer for preprocess_batch
 
     def preprocess(self, img: Image.Image) -> np.ndarray:
         """Return CHW float32, normalized ImageNet style."""
         img = img.convert("RGB").resize((self.input_size, self.input_size))
         arr = np.asarray(img).astype("float32") / 255.0
         # normalize to ImageNet stats
-        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
-        std  = np.array([0.229, 0.224, 0.225], dtype=np.float32)
-        arr = (arr - mean) / std
+        arr = (arr - IMAGENET_MEAN) / IMAGENET_STD
         arr = arr.transpose(2, 0, 1)  # HWC -> CHW
         return arr
 
+    def preprocess_batch(self, imgs: Sequence[Union[Image.Image, np.ndarray]]) -> np.ndarray:
+        """
+        Return one contiguous NCHW float32 array, normalized ImageNet style.
+        Accepts PIL images or decoded HWC uint8 arrays already at input_size.
+        The result is a view into a per-thread buffer reused by the next call,
+        so consume it (run the forward pass) before preprocessing another batch.
+        """
+        n, s = len(imgs), self.input_size
+        buf = getattr(self._bufs, "arr", None)
+        if buf is None or buf.shape[0] < n:
+            buf = self._bufs.arr = np.empty((n, 3, s, s), dtype=np.float32)
+        out = buf[:n]
+        for i, img in enumerate(imgs):
+            if isinstance(img, Image.Image):
+                if img.mode != "RGB":
+                    img = img.convert("RGB")
+                if img.size != (s, s):
+                    img = img.resize((s, s))
+                img = np.asarray(img)
+            if img.shape != (s, s, 3):
+                raise ValueError(f"Expected HWC array of shape {(s, s, 3)}, got {img.shape}")
+            out[i] = img.transpose(2, 0, 1)  # uint8 HWC -> float32 CHW, no temporaries
+        # fused normalization, in place: x * 1/(255*std) - mean/std
+        out *= _NORM_SCALE
+        out += _NORM_BIAS
+        return out
+
     def predict_logits(self, img: Image.Image) -> np.ndarray:
+        return self.predict_logits_batch([img])[0]
+
+    def predict_logits_batch(self, imgs: List[Image.Image]) -> np.ndarray:
+        """Return (N, C) logits for N images, one forward pass where the backend allows it."""
         raise NotImplementedError
 
 
@@ -120,12 +156,11 @@ class TorchClassifier(_BaseClassifier):
 
         self._to = torch.no_grad()
 
-    def predict_logits(self, img: Image.Image) -> np.ndarray:
-        x = self.preprocess(img)  # CHW
-        x = torch.from_numpy(x).unsqueeze(0)  # NCHW
+    def predict_logits_batch(self, imgs: List[Image.Image]) -> np.ndarray:
+        x = self.preprocess_batch(imgs)  # NCHW
         with torch.no_grad():
-            logits = self.net(x)  # (1, C)
-        return logits.numpy()[0]
+            logits = self.net(torch.from_numpy(x))  # (N, C)
+        return logits.numpy()
 
 
 class ONNXClassifier(_BaseClassifier):
@@ -135,14 +170,18 @@ class ONNXClassifier(_BaseClassifier):
         input_size = int(model_info.get("input_size", 224)) if model_info else 224
         super().__init__(taxonomy, input_size=input_size)
         self.sess = ort.InferenceSession(str(onnx_path), providers=["CPUExecutionProvider"])
-        self.input_name = self.sess.get_inputs()[0].name
+        inp = self.sess.get_inputs()[0]
+        self.input_name = inp.name
         self.output_name = self.sess.get_outputs()[0].name
+        # Exports with a fixed batch dim of 1 can't take a stacked batch
+        self.dynamic_batch = not (isinstance(inp.shape[0], int) and inp.shape[0] == 1)
 
-    def predict_logits(self, img: Image.Image) -> np.ndarray:
-        x = self.preprocess(img)  # CHW
-        x = np.expand_dims(x, 0)  # NCHW
-        out = self.sess.run([self.output_name], {self.input_name: x})[0]
-        return out[0]
+    def predict_logits_batch(self, imgs: List[Image.Image]) -> np.ndarray:
+        x = self.preprocess_batch(imgs)  # NCHW
+        if self.dynamic_batch:
+            return self.sess.run([self.output_name], {self.input_name: x})[0]
+        outs = [self.sess.run([self.output_name], {self.input_name: x[i:i + 1]})[0] for i in range(len(x))]
+        return np.concatenate(outs, axis=0)
 
 
 class MockClassifier(_BaseClassifier):
@@ -158,8 +197,38 @@ class MockClassifier(_BaseClassifier):
         logits = rng.normal(size=len(self.tax.idx2id)).astype("float32")
         return logits
 
+    def predict_logits_batch(self, imgs: List[Image.Image]) -> np.ndarray:
+        return np.stack([self.predict_logits(img) for img in imgs])
+
 
 # ---------- Facade ----------
+def configured_input_size() -> int:
+    """Model input size from model.json, without loading the model."""
+    info = FishIDModel._load_model_info()
+    return int(info.get("input_size", 224)) if info else 224
+
+
+def model_version() -> str:
+    """Fingerprint of backend, weights and taxonomy files; changes whenever predictions could."""
+    engine = detect_engine()
+    h = hashlib.sha1(engine.encode())
+    weights = {"onnx": ONNX_MODEL, "torch": PTH_MODEL}.get(engine)
+    for p in (weights, CLASSES_TXT, MODEL_INFO, SPECIES_CSV):
+        if p is not None and p.exists():
+            st = p.stat()
+            h.update(f"{p.name}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return f"{engine}-{h.hexdigest()[:12]}"
+
+
+def detect_engine() -> str:
+    """Which backend FishIDModel will pick, without loading it."""
+    if ONNX_MODEL.exists() and _HAVE_ORT:
+        return "onnx"
+    if PTH_MODEL.exists() and _HAVE_TORCH:
+        return "torch"
+    return "mock"
+
+
 class FishIDModel:
     """Loads taxonomy + the best available classifier backend (ONNX, Torch, or Mock)."""
 
@@ -168,15 +237,13 @@ class FishIDModel:
         self.info = self._load_model_info()
 
         # Choose backend by available files/libs
-        if ONNX_MODEL.exists() and _HAVE_ORT:
+        self.engine = detect_engine()
+        if self.engine == "onnx":
             self.backend = ONNXClassifier(self.tax, ONNX_MODEL, self.info)
-            self.engine = "onnx"
-        elif PTH_MODEL.exists() and _HAVE_TORCH:
+        elif self.engine == "torch":
             self.backend = TorchClassifier(self.tax, PTH_MODEL, self.info)
-            self.engine = "torch"
         else:
             self.backend = MockClassifier(self.tax)
-            self.engine = "mock"
 
     @staticmethod
     def _load_model_info() -> Optional[dict]:
@@ -200,7 +267,14 @@ class FishIDModel:
         return idx, probs[idx]
 
     def predict(self, img: Image.Image, k: int = 3):
-        logits = self.backend.predict_logits(img)
+        return self.predict_batch([img], k=k)[0]
+
+    def predict_batch(self, imgs: List[Image.Image], k: int = 3) -> List[dict]:
+        """Run one forward pass over all images, return a top-k result per image."""
+        logits = self.backend.predict_logits_batch(imgs)
+        return [self._postprocess(row, k) for row in logits]
+
+    def _postprocess(self, logits: np.ndarray, k: int) -> dict:
         # If model's num_classes doesn't match taxonomy (common during setup), truncate/pad
         C = len(self.tax.idx2id)
         if logits.shape[0] != C:
@@ -1,10 +1,21 @@
 # ml/predict.py
 from __future__ import annotations
+import asyncio
+import hashlib
+from contextlib import ExitStack
 from io import BytesIO
 from PIL import Image
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
-from .model import get_model
+from .model import configured_input_size, get_model, model_version
+from .batching import get_batcher
+from .cache import PredictionCache, get_cache
+from .executor import get_executor
+
+# Decode target; read from model.json so the parent process never has to load the model
+INPUT_SIZE = configured_input_size()
+# Part of every cache key, so swapping the model never serves stale predictions
+MODEL_VERSION = model_version()
 
 def run_inference(image_bytes: bytes) -> Dict[str, Any]:
     """
@@ -18,10 +29,88 @@ def run_inference(image_bytes: bytes) -> Dict[str, Any]:
       "num_classes": 60
     }
     """
-    img = Image.open(BytesIO(image_bytes)).convert("RGB")
+    img = decode_image(image_bytes)
     model = get_model()
     result = model.predict(img, k=3)
+    return _promote_top1(result)
+
+async def run_inference_async(image_bytes: bytes, digest: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Same contract as run_inference, but nothing runs on the event loop:
+    decoding goes to the executor's thread pool, and the forward pass goes
+    through the micro-batcher so concurrent requests share one predict_batch call.
+    Results are cached by sha256 of the bytes (pass `digest` if already known),
+    so a re-uploaded photo skips decoding and inference entirely.
+    Raises InferenceBusy when the executor is saturated.
+    """
+    cache = get_cache()
+    key = PredictionCache.make_key(MODEL_VERSION, digest or hashlib.sha256(image_bytes).hexdigest())
+    out = await cache.aget(key)
+    if out is not None:
+        return out
+
+    executor = get_executor()
+    with executor.admit():
+        img = await executor.decode(decode_image, image_bytes)
+        result = await get_batcher().submit(img)
+    out = _promote_top1(result)
+    await cache.aput(key, out)
+    return out
+
+async def run_inference_many_async(images: List[bytes], digests: Optional[List[str]] = None) -> List[Any]:
+    """
+    run_inference_async for several images at once (batch ingest). Cache misses
+    are admitted together, all decodes finish first, and then every forward pass
+    is queued in the same tick so the micro-batcher packs them into full batches.
+    Returns one result per image, or the exception for an image that failed.
+    Raises InferenceBusy (before doing any work) when the executor is saturated.
+    """
+    cache = get_cache()
+    digests = digests or [hashlib.sha256(b).hexdigest() for b in images]
+    keys = [PredictionCache.make_key(MODEL_VERSION, d) for d in digests]
+    out: List[Any] = list(await asyncio.gather(*(cache.aget(k) for k in keys)))
+    misses = [i for i, r in enumerate(out) if r is None]
+    if not misses:
+        return out
+
+    executor = get_executor()
+    with ExitStack() as admitted:
+        for _ in misses:
+            admitted.enter_context(executor.admit())
+        imgs = await asyncio.gather(*(executor.decode(decode_image, images[i]) for i in misses),
+                                    return_exceptions=True)
+        batcher = get_batcher()
+        ok = [(i, img) for i, img in zip(misses, imgs) if not isinstance(img, Exception)]
+        results = await asyncio.gather(*(batcher.submit(img) for _, img in ok), return_exceptions=True)
+
+    for i, img in zip(misses, imgs):
+        if isinstance(img, Exception):
+            out[i] = img
+    for (i, _), result in zip(ok, results):
+        if isinstance(result, Exception):
+            out[i] = result
+        else:
+            out[i] = _promote_top1(result)
+            await cache.aput(keys[i], out[i])
+    return out
+
+def decode_image(image_bytes: bytes, size: int = INPUT_SIZE) -> Image.Image:
+    """
+    Decode an upload straight to the model's input size (RGB, size x size).
+    JPEGs are scaled by libjpeg during decode (draft mode picks the smallest
+    1/2, 1/4, 1/8 scale still >= size), so a 12 MP photo never exists in memory
+    at full resolution. PNG/WebP are decoded fully, then box-reduced before the
+    final resample.
+    """
+    img = Image.open(BytesIO(image_bytes))
+    if img.format == "JPEG":
+        img.draft("RGB", (size, size))
+    img = img.convert("RGB")
+    if img.size != (size, size):
+        img = img.resize((size, size), reducing_gap=3.0)
+    return img
 
+def _promote_top1(result: Dict[str, Any]) -> Dict[str, Any]:
     # promote top-1 for convenience
     top1 = result["topk"][0]
     out = {